@@ -1,14 +1,26 @@
 import context
+import tracer
 
 CDB = {} 
 CDB_Queue = []
 
+# tag -> [(station or register, operand)] waiting on that tag, where operand
+# is 'j' (Qj/Vj), 'k' (Qk/Vk) or 'i' (a register's Qi/Value)
+consumers = {}
+
+def initialize_CDB():
+    global CDB, CDB_Queue, consumers
+    CDB = {}
+    CDB_Queue = []
+    consumers = {}
+
 def Enter_CDB_Queue(tag, value):
     global CDB
     global CDB_Queue
 
     CDB_Queue.append((tag, value))
-    print(f"Entered CDB Queue: Tag={tag}, Value={value}")
+    if tracer.cdb >= tracer.DEBUG:
+        tracer.emit('cdb', f"Entered CDB Queue: Tag={context.tag_name(tag)}, Value={value}")
 
 
 def write_to_CDB():
@@ -19,7 +31,8 @@ def write_to_CDB():
     payload = CDB_Queue.pop(0)
     CDB['tag'] = payload[0]
     CDB['value'] = payload[1]
-    print(f"Written to CDB: {CDB}")
+    if tracer.cdb >= tracer.INFO:
+        tracer.emit('cdb', f"Written to CDB: {{'tag': '{context.tag_name(CDB['tag'])}', 'value': {CDB['value']!r}}}")
         
 def listen_to_CDB():
     global CDB
@@ -29,54 +42,27 @@ def listen_to_CDB():
     tag = CDB['tag']
     value = CDB['value']
     
-    print(f"Listening to CDB: Tag={tag}, Value={value}")
+    if tracer.cdb >= tracer.DEBUG:
+        tracer.emit('cdb', f"Listening to CDB: Tag={context.tag_name(tag)}, Value={value}")
 
     if tag is None or value is None:
         return
     
-    for station in context.adder_reservation_stations.values():
-        if station["Qj"] == tag:
-            station["Vj"] = value
-            station["Qj"] = "0"
-        if station["Qk"] == tag:
-            station["Vk"] = value
-            station["Qk"] = "0"
-    
-    for station in context.mult_reservation_stations.values():
-        if station["Qj"] == tag:
-            station["Vj"] = value
-            station["Qj"] = "0"
-        if station["Qk"] == tag:
-            station["Vk"] = value
-            station["Qk"] = "0"
-    
-    for station in context.fp_adder_reservation_stations.values():
-        if station["Qj"] == tag:
-            station["Vj"] = value
-            station["Qj"] = "0"
-        if station["Qk"] == tag:
-            station["Vk"] = value
-            station["Qk"] = "0"
-    
-    for station in context.fp_mult_reservation_stations.values():
-        if station["Qj"] == tag:
-            station["Vj"] = value
-            station["Qj"] = "0"
-        if station["Qk"] == tag:
-            station["Vk"] = value
-            station["Qk"] = "0"
-    
-    for reg in context.floating_point_registers.values():
-        if reg["Qi"] == tag:
-            reg["Value"] = value
-            reg["Qi"] = "0"
-            
-    for buffer in context.store_buffers.values():
-        if buffer["Qj"] == tag:
-            buffer["Vj"] = value
-            buffer["Qj"] = "0"
-        if buffer["Qk"] == tag:
-            buffer["Vk"] = value
-            buffer["Qk"] = "0"
+    wake_consumers(tag, value)
+
+def add_consumer(tag, entry, operand):
+    consumers.setdefault(tag, []).append((entry, operand))
 
-        
\ No newline at end of file
+def wake_consumers(tag, value):
+    for entry, operand in consumers.pop(tag, ()):
+        if operand == 'j':
+            if entry.Qj == tag:
+                entry.Vj = value
+                entry.Qj = 0
+        elif operand == 'k':
+            if entry.Qk == tag:
+                entry.Vk = value
+                entry.Qk = 0
+        elif entry.Qi == tag:
+            entry.Value = value
+            entry.Qi = 0
@@ -0,0 +1,221 @@
+import copy
+
+import numpy as np
+
+import context
+import cycles
+import execute
+import fetch
+import lsq
+import opcodes
+import simulator
+
+# Lockstep simulation of one program over many data sets. Register values,
+# station operands, CDB values and data memory carry one lane per data set
+# (data memory is a lanes x bytes uint8 array), while the timing model runs
+# once for all lanes. install() swaps the few functions that compute on
+# values for lane-wise versions, the same way profiler.install() wraps
+# stages. When lanes disagree about something that steers timing, i.e. a
+# branch outcome or a load/store address, the batch is rolled back to its
+# last snapshot and split into one batch per outcome.
+
+memory_dtypes = {opcode: np.dtype(layout.format) for opcode, layout in context.memory_formats.items()}
+
+originals = {}
+
+class LaneDivergence(Exception):
+    def __init__(self, outcomes):
+        super().__init__("lanes diverged")
+        self.outcomes = outcomes
+
+def lane_count():
+    return context.data_memory.shape[0]
+
+def lanes_of(value):
+    return np.broadcast_to(value, (lane_count(),))
+
+def as_int(value):
+    if isinstance(value, np.ndarray):
+        return value.astype(np.int64)
+    return int(value)
+
+def execute_fp_arithmatic(op, rs, rt):
+    operation = opcodes.TABLE[op].operation
+    if operation is opcodes.fp_divide:
+        # numpy division already gives fp_divide's IEEE 754 results per lane
+        operation = np.true_divide
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return operation(np.asarray(rs, dtype=np.float64), np.asarray(rt, dtype=np.float64))
+
+def execute_integer_arithmatic(op, rs, rt, immediate):
+    row = opcodes.TABLE[op]
+    rt = int(immediate) if row.shape == opcodes.IMMEDIATE else as_int(rt)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return row.operation(as_int(rs), rt)
+
+def handle_loop_instruction(opcode, rs_value, rt_value, target):
+    taken = lanes_of(execute.compute_if_loop(rs_value, rt_value, opcode))
+    if not (taken.all() or not taken.any()):
+        raise LaneDivergence(taken)
+    # every lane agrees, so lane 0 decides for all of them
+    return originals['handle_loop_instruction'](opcode, lanes_of(rs_value)[0].item(), lanes_of(rt_value)[0].item(),
+                                                target)
+
+def start_execution(station):
+    if station.unit == context.LOAD or station.unit == context.STORE:
+        base = lanes_of(as_int(station.Vj))
+        if (base != base[0]).any():
+            raise LaneDivergence(base)
+        station.Vj = int(base[0])
+    return originals['start_execution'](station)
+
+def get_from_memory(address, opcode):
+    dtype = memory_dtypes[opcode]
+    if address < 0 or address + dtype.itemsize > context.data_memory.shape[1]:
+        raise IndexError(f"Load of {dtype.itemsize} bytes at address {address} is outside data memory")
+    values = context.data_memory[:, address:address + dtype.itemsize].copy().view(dtype)[:, 0]
+    if dtype.kind == 'f':
+        return values.astype(np.float64)
+    return values.astype(np.int64)
+
+def write_to_memory(address, value, opcode):
+    dtype = memory_dtypes[opcode]
+    if address < 0 or address + dtype.itemsize > context.data_memory.shape[1]:
+        raise IndexError(f"Store of {dtype.itemsize} bytes at address {address} is outside data memory")
+    values = np.ascontiguousarray(lanes_of(value).astype(dtype))
+    context.data_memory[:, address:address + dtype.itemsize] = values.view(np.uint8).reshape(-1, dtype.itemsize)
+
+def address_of(base, offset):
+    base = lanes_of(as_int(base))
+    if (base != base[0]).any():
+        raise LaneDivergence(base)
+    return int(base[0]) + int(offset)
+
+def forward_value(value, store_opcode, load_opcode):
+    values = np.ascontiguousarray(lanes_of(value).astype(memory_dtypes[store_opcode]))
+    values = values.view(memory_dtypes[load_opcode])
+    if values.dtype.kind == 'f':
+        return values.astype(np.float64)
+    return values.astype(np.int64)
+
+LANE_FUNCTIONS = (
+    (execute, 'execute_fp_arithmatic', execute_fp_arithmatic),
+    (execute, 'execute_integer_arithmatic', execute_integer_arithmatic),
+    (execute, 'handle_loop_instruction', handle_loop_instruction),
+    (cycles, 'start_execution', start_execution),
+    (fetch, 'get_from_memory', get_from_memory),
+    (fetch, 'write_to_memory', write_to_memory),
+    (lsq, 'address_of', address_of),
+    (lsq, 'forward_value', forward_value),
+)
+
+def install():
+    for module, name, function in LANE_FUNCTIONS:
+        if name not in originals:
+            originals[name] = getattr(module, name)
+            setattr(module, name, function)
+
+def uninstall():
+    for module, name, _ in LANE_FUNCTIONS:
+        if name in originals:
+            setattr(module, name, originals.pop(name))
+
+def select_lanes(value, lanes):
+    if isinstance(value, np.ndarray) and value.ndim == 1:
+        return value[lanes]
+    return value
+
+def restrict_state(state, lanes):
+    # keep only `lanes` of every per-lane value in a captured machine state
+    for register in state['context']['registers']:
+        register.Value = select_lanes(register.Value, lanes)
+    for station in state['context']['stations'][1:]:
+        station.Vj = select_lanes(station.Vj, lanes)
+        station.Vk = select_lanes(station.Vk, lanes)
+    for entry in state['rob']['buffer']:
+        entry.value = select_lanes(entry.value, lanes)
+    decisions = state['lsq']['decisions']
+    for station_id, (decision, seq, value) in decisions.items():
+        decisions[station_id] = (decision, seq, select_lanes(value, lanes))
+    bus = state['CDB']['CDB']
+    if 'value' in bus:
+        bus['value'] = select_lanes(bus['value'], lanes)
+    state['CDB']['CDB_Queue'] = [(tag, select_lanes(value, lanes)) for tag, value in state['CDB']['CDB_Queue']]
+    memory = state['context']['data_memory'][lanes]
+    state['context']['data_memory'] = memory
+    state['context']['data_view'] = memoryview(memory)
+
+def snapshot(machine):
+    machine.activate()
+    state = simulator.capture_machine_state()
+    del state['context']['data_view']
+    # the program itself never changes, so it is shared rather than copied
+    memo = {id(context.decoded_program): context.decoded_program,
+            id(context.instruction_memory): context.instruction_memory}
+    return copy.deepcopy(state, memo)
+
+def restore(config, state, lanes):
+    machine = simulator.Simulator.__new__(simulator.Simulator)
+    machine.config = config
+    machine.state = copy.deepcopy(state)
+    restrict_state(machine.state, lanes)
+    return machine
+
+def make_lanes(values):
+    if all(value == values[0] for value in values):
+        return values[0]
+    return np.array(values)
+
+def run_batch(program, data_sets, config=None, stations=None, max_cycles=1000000, snapshot_interval=256):
+    # data_sets: one {'registers': {name: value}, 'memory': [(address, bytes)]}
+    # per lane. Returns one {'registers', 'memory', 'statistics'} per lane.
+    if (config or {}).get('branch_predictor') is not None:
+        raise ValueError("Lockstep lanes split on branch outcomes and cannot run with a branch predictor")
+    install()
+    try:
+        machine = simulator.Simulator(program, config=config, stations=stations)
+        names = sorted({name for data in data_sets for name in data.get('registers', {})})
+        for name in names:
+            value = make_lanes([data.get('registers', {}).get(name, 0.0) for data in data_sets])
+            machine.set_register(name, value)
+        memory = np.zeros((len(data_sets), len(context.data_memory)), dtype=np.uint8)
+        for lane, data in enumerate(data_sets):
+            for address, content in data.get('memory', ()):
+                memory[lane, address:address + len(content)] = np.frombuffer(content, dtype=np.uint8)
+        context.release_data_memory()
+        context.data_memory = memory
+        context.data_view = memoryview(memory)
+
+        results = [None] * len(data_sets)
+        pending = [(machine, np.arange(len(data_sets)))]
+        while pending:
+            machine, lanes = pending.pop()
+            saved = snapshot(machine)
+            try:
+                while not machine.done() and context.clock_cycle < max_cycles:
+                    simulator.run(min(max_cycles, context.clock_cycle + snapshot_interval), interactive=False)
+                    saved = snapshot(machine)
+            except LaneDivergence as divergence:
+                for outcome in np.unique(divergence.outcomes):
+                    group = np.flatnonzero(divergence.outcomes == outcome)
+                    pending.append((restore(machine.config, saved, group), lanes[group]))
+                continue
+            collect_results(machine, lanes, results)
+        return results
+    finally:
+        uninstall()
+
+def collect_results(machine, lanes, results):
+    statistics = machine.statistics()
+    for index, lane in enumerate(lanes):
+        registers = {}
+        for register in context.registers:
+            value = register.Value
+            if isinstance(value, np.ndarray):
+                value = value[index]
+            registers[register.name] = value.item() if isinstance(value, np.generic) else value
+        results[lane] = {
+            "registers": registers,
+            "memory": context.data_memory[index].tobytes(),
+            "statistics": statistics,
+        }
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+import context
+import functional
+import simulator
+import tracer
+
+KERNEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kernels')
+BASELINE_FILE = os.path.join(KERNEL_DIR, 'baseline.json')
+
+# registers: initial register values; memory and expected_memory: lists of
+# (address, struct format character, values) laid out little-endian
+Kernel = namedtuple('Kernel', ('name', 'program', 'config', 'registers', 'memory',
+                               'expected_registers', 'expected_memory'))
+
+MEMORY_CONFIG = {"data_memory_size": 4096}
+
+def daxpy(n=32, a=2.5):
+    x = [i + 0.25 for i in range(n)]
+    y = [100.0 - 3 * i for i in range(n)]
+    return Kernel('daxpy', 'daxpy.txt', MEMORY_CONFIG,
+                  {'F0': a, 'R1': 0, 'R2': 8 * n, 'R3': n},
+                  [(0, 'd', x), (8 * n, 'd', y)],
+                  {'R1': 8 * n, 'R2': 16 * n, 'R3': 0},
+                  [(8 * n, 'd', [xi * a + yi for xi, yi in zip(x, y)])])
+
+def dot_product(n=32):
+    x = [1.0 + i / 8 for i in range(n)]
+    y = [2.0 - i / 16 for i in range(n)]
+    total = 0.0
+    for xi, yi in zip(x, y):
+        total = total + xi * yi
+    return Kernel('dot', 'dot.txt', MEMORY_CONFIG,
+                  {'R1': 0, 'R2': 8 * n, 'R3': n, 'R4': 16 * n},
+                  [(0, 'd', x), (8 * n, 'd', y)],
+                  {'F0': total, 'R3': 0},
+                  [(16 * n, 'd', [total])])
+
+def matrix_multiply(n=3):
+    # matmul.txt is written for 3x3 matrices: A at 0, B at 72, C at 144
+    a = [float(i + 1) for i in range(n * n)]
+    b = [float(2 * i - 5) for i in range(n * n)]
+    c = []
+    for i in range(n):
+        for j in range(n):
+            total = 0.0
+            for k in range(n):
+                total = total + a[i * n + k] * b[k * n + j]
+            c.append(total)
+    return Kernel('matmul', 'matmul.txt', MEMORY_CONFIG,
+                  {'R1': 0, 'R3': 144},
+                  [(0, 'd', a), (72, 'd', b)],
+                  {'R10': 0, 'R11': 0, 'R12': 0},
+                  [(144, 'd', c)])
+
+def reduction(n=64):
+    values = [(i % 7) * 1.5 - 2.0 for i in range(n)]
+    even = odd = 0.0
+    for i in range(0, n, 2):
+        even = even + values[i]
+        odd = odd + values[i + 1]
+    return Kernel('reduction', 'reduction.txt', MEMORY_CONFIG,
+                  {'R1': 0, 'R3': n, 'R4': 8 * n},
+                  [(0, 'd', values)],
+                  {'F0': even + odd, 'R3': 0},
+                  [(8 * n, 'd', [even + odd])])
+
+def pointer_chase(n=24):
+    # nodes of (next address: int64, value: double) visited in a scrambled
+    # order; address 0 ends the list
+    order = [(i * 7) % n for i in range(n)]
+    address = [16 + 16 * slot for slot in range(n)]
+    memory = []
+    total = 0.0
+    for position, slot in enumerate(order):
+        next_address = address[order[position + 1]] if position + 1 < n else 0
+        value = slot * 0.5 + 1.0
+        total = total + value
+        memory.append((address[slot], 'q', [next_address]))
+        memory.append((address[slot] + 8, 'd', [value]))
+    result = 16 + 16 * n
+    return Kernel('pointer_chase', 'pointer_chase.txt', MEMORY_CONFIG,
+                  {'R1': address[order[0]], 'R4': result},
+                  memory,
+                  {'F0': total, 'R1': 0, 'R2': n},
+                  [(result, 'd', [total])])
+
+def divide(n=16):
+    # two Newton steps of sqrt per element, starting from a / 2
+    values = [2.0 + 3 * i for i in range(n)]
+    roots = []
+    for a in values:
+        x = a / 2.0
+        for _ in range(2):
+            x = (x + a / x) * 0.5
+        roots.append(x)
+    return Kernel('divide', 'divide.txt', MEMORY_CONFIG,
+                  {'R1': 0, 'R2': 8 * n, 'R3': n, 'F8': 2.0, 'F10': 0.5},
+                  [(0, 'd', values)],
+                  {'R3': 0},
+                  [(8 * n, 'd', roots)])
+
+def forward(n=16, step=0.25):
+    # each iteration stores to the address its next load reads, and stores
+    # again to the address the next iteration loads and overwrites, so loads
+    # take their data from older stores and stores alias each other
+    values = [4.0] + [0.0] * n
+    for i in range(n):
+        values[i] = values[i] + step
+        values[i + 1] = values[i]
+    return Kernel('forward', 'forward.txt', MEMORY_CONFIG,
+                  {'R1': 0, 'R3': n, 'F4': step},
+                  [(0, 'd', [4.0])],
+                  {'R1': 8 * n, 'R3': 0, 'F2': values[n - 1], 'F6': values[n - 1]},
+                  [(0, 'd', values)])
+
+KERNELS = (daxpy, dot_product, matrix_multiply, reduction, pointer_chase, divide, forward)
+
+def pack(layout, values):
+    return struct.pack(f'<{len(values)}{layout}', *values)
+
+def check_state(machine, kernel):
+    errors = []
+    for register, expected in kernel.expected_registers.items():
+        value = machine.get_register(register)
+        if value != expected:
+            errors.append(f"{register} = {value!r}, expected {expected!r}")
+    for address, layout, expected in kernel.expected_memory:
+        data = machine.dump_memory(address, struct.calcsize(f'<{len(expected)}{layout}'))
+        values = list(struct.unpack(f'<{len(expected)}{layout}', data))
+        if values != list(expected):
+            errors.append(f"memory at {address} = {values}, expected {list(expected)}")
+    return errors
+
+def check_functional(machine, kernel):
+    # the final state must also match the same kernel run on functional.py
+    reference = load_kernel(kernel)
+    functional.run_functional()
+    errors = []
+    for register in context.register_ids:
+        value, expected = machine.get_register(register), reference.get_register(register)
+        if value != expected:
+            errors.append(f"{register} = {value!r}, functional model {expected!r}")
+    memory, expected = machine.dump_memory(), reference.dump_memory()
+    if memory != expected:
+        address = next(i for i, (byte, other) in enumerate(zip(memory, expected)) if byte != other)
+        errors.append(f"memory differs from the functional model from address {address}")
+    return errors
+
+def load_kernel(kernel):
+    machine = simulator.Simulator(os.path.join(KERNEL_DIR, kernel.program), config=kernel.config)
+    for register, value in kernel.registers.items():
+        machine.set_register(register, value)
+    for address, layout, values in kernel.memory:
+        machine.load_memory(pack(layout, values), address)
+    return machine
+
+def run_kernel(kernel, repeat=1, max_cycles=1000000):
+    host_seconds = None
+    for _ in range(repeat):
+        machine = load_kernel(kernel)
+        start = time.perf_counter()
+        machine.run(max_cycles)
+        elapsed = time.perf_counter() - start
+        if host_seconds is None or elapsed < host_seconds:
+            host_seconds = elapsed
+
+    statistics = machine.statistics()
+    errors = [] if statistics["finished"] else [f"not finished after {max_cycles} cycles"]
+    errors += check_state(machine, kernel)
+    errors += check_functional(machine, kernel)
+    return {
+        "cycles": statistics["cycles"],
+        "instructions": statistics["instructions"],
+        "host_seconds": host_seconds,
+        "cycles_per_second": statistics["cycles"] / host_seconds if host_seconds > 0 else 0.0,
+        "errors": errors,
+    }
+
+# register holding each kernel's trip count and the step it counts down by
+TRIP_COUNTS = {'daxpy': ('R3', 1), 'dot': ('R3', 1), 'reduction': ('R3', 2), 'divide': ('R3', 1),
+               'forward': ('R3', 1)}
+
+def check_batch(kernel, lanes=4, max_cycles=1000000):
+    # runs `lanes` copies of the kernel in lockstep (batch.py) with scaled
+    # data and, where the kernel has a trip count, a different one per lane
+    # so that the batch splits; every lane must match a scalar run
+    import batch    # needs numpy
+    data_sets = []
+    for lane in range(lanes):
+        registers = dict(kernel.registers)
+        if kernel.name in TRIP_COUNTS:
+            register, step = TRIP_COUNTS[kernel.name]
+            registers[register] -= step * lane
+        memory = [(address, pack(layout, [value * (1 + lane / 4) if layout == 'd' else value for value in values]))
+                  for address, layout, values in kernel.memory]
+        data_sets.append({'registers': registers, 'memory': memory})
+    results = batch.run_batch(os.path.join(KERNEL_DIR, kernel.program), data_sets, config=kernel.config,
+                              max_cycles=max_cycles)
+    errors = []
+    for lane, (data, result) in enumerate(zip(data_sets, results)):
+        machine = simulator.Simulator(os.path.join(KERNEL_DIR, kernel.program), config=kernel.config)
+        for register, value in data['registers'].items():
+            machine.set_register(register, value)
+        for address, content in data['memory']:
+            machine.load_memory(content, address)
+        machine.run(max_cycles)
+        registers = {register.name: register.Value for register in context.registers}
+        if result['registers'] != registers:
+            errors.append(f"lane {lane}: registers differ from a scalar run")
+        if result['memory'] != machine.dump_memory():
+            errors.append(f"lane {lane}: memory differs from a scalar run")
+        if result['statistics'] != machine.statistics():
+            errors.append(f"lane {lane}: statistics differ from a scalar run")
+    return errors
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def save_baseline(results, path=BASELINE_FILE):
+    baseline = {name: {key: result[key] for key in ("cycles", "instructions", "cycles_per_second")}
+                for name, result in results.items()}
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+def compare(results, baseline, tolerance):
+    # simulated cycles, instructions and final state must match exactly; a
+    # host speed drop of more than `tolerance` is reported but does not fail
+    failures = 0
+    print(f"{'kernel':<14} {'cycles':>8} {'insts':>6} {'host s':>9} {'cycles/s':>11} {'vs base':>8}  status")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        status = []
+        failed = False
+        if result["errors"]:
+            status.append("wrong state: " + "; ".join(result["errors"]))
+            failed = True
+        speed = ''
+        if reference is not None:
+            if (result["cycles"], result["instructions"]) != (reference["cycles"], reference["instructions"]):
+                status.append(f"timing changed: baseline {reference['cycles']} cycles, "
+                              f"{reference['instructions']} instructions")
+                failed = True
+            ratio = result["cycles_per_second"] / reference["cycles_per_second"]
+            speed = f"{ratio:.2f}x"
+            if ratio < 1 - tolerance:
+                status.append("slower")
+        else:
+            status.append("no baseline")
+        failures += failed
+        print(f"{name:<14} {result['cycles']:>8} {result['instructions']:>6} {result['host_seconds']:>9.5f} "
+              f"{result['cycles_per_second']:>11.0f} {speed:>8}  {', '.join(status) or 'ok'}")
+    return failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark kernels and compare them with the baseline")
+    parser.add_argument("kernels", nargs="*", help="kernels to run (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="runs per kernel; the fastest host time is reported")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="host speed drop relative to the baseline that is reported as slower")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--batch", action="store_true",
+                        help="also run each kernel as a lockstep batch (needs numpy) and compare every lane "
+                             "with a scalar run")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tracer.set_level(tracer.OFF)
+    kernels = [make() for make in KERNELS]
+    if args.kernels:
+        unknown = set(args.kernels) - {kernel.name for kernel in kernels}
+        if unknown:
+            print(f"Unknown kernels: {', '.join(sorted(unknown))}", file=sys.stderr)
+            return 2
+        kernels = [kernel for kernel in kernels if kernel.name in args.kernels]
+
+    results = {kernel.name: run_kernel(kernel, args.repeat) for kernel in kernels}
+    failures = compare(results, load_baseline(args.baseline), args.tolerance)
+    if args.batch:
+        for kernel in kernels:
+            errors = check_batch(kernel)
+            failures += bool(errors)
+            print(f"batch {kernel.name:<14} {'; '.join(errors) or 'ok'}")
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
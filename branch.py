@@ -0,0 +1,212 @@
+from collections import namedtuple
+
+import context
+import cycles
+import fetch
+import CDB
+import rob
+import tracer
+
+# Branch prediction and speculative issue. With context.branch_predictor
+# set, BEQ/BNE no longer stall fetch: issue continues on the predicted path
+# and each unresolved branch keeps a checkpoint of the register file.
+# Instructions younger than the oldest unresolved branch may issue and
+# execute but are held in the Result queue until it resolves, so nothing
+# speculative reaches the CDB, the registers or memory. A misprediction
+# squashes every younger station and restores the checkpoint.
+#
+# With a reorder buffer (rob.py) speculative results only reach the buffer,
+# so they write back freely, branches may resolve out of order and no
+# checkpoint is needed: a misprediction flushes the younger entries and the
+# register status is rebuilt from the ones that remain.
+
+class StaticPredictor:
+    def __init__(self, taken):
+        self.taken = taken
+
+    def predict(self, pc):
+        return self.taken
+
+    def update(self, pc, taken):
+        pass
+
+class BimodalPredictor:
+    # a table of 2-bit saturating counters indexed by pc; 2 and 3 predict taken
+    def __init__(self, entries):
+        self.counters = bytearray([1] * entries)
+
+    def index(self, pc):
+        return pc % len(self.counters)
+
+    def predict(self, pc):
+        return self.counters[self.index(pc)] >= 2
+
+    def update(self, pc, taken):
+        slot = self.index(pc)
+        if taken:
+            self.counters[slot] = min(self.counters[slot] + 1, 3)
+        else:
+            self.counters[slot] = max(self.counters[slot] - 1, 0)
+
+class GsharePredictor(BimodalPredictor):
+    # 2-bit counters indexed by pc xor the global history of outcomes
+    def __init__(self, entries, history_bits):
+        super().__init__(entries)
+        self.history = 0
+        self.history_mask = (1 << history_bits) - 1
+
+    def index(self, pc):
+        return (pc ^ self.history) % len(self.counters)
+
+    def update(self, pc, taken):
+        super().update(pc, taken)
+        self.history = ((self.history << 1) | taken) & self.history_mask
+
+class BranchTargetBuffer:
+    # direct-mapped; a predicted-taken branch that misses here falls through
+    # because fetch has no target to redirect to
+    def __init__(self, entries):
+        self.tags = [-1] * entries
+        self.targets = [0] * entries
+
+    def lookup(self, pc):
+        slot = pc % len(self.tags)
+        if self.tags[slot] == pc:
+            return self.targets[slot]
+        return None
+
+    def update(self, pc, target):
+        slot = pc % len(self.tags)
+        self.tags[slot] = pc
+        self.targets[slot] = target
+
+PendingBranch = namedtuple('PendingBranch', ('station', 'seq', 'pc', 'taken', 'target', 'checkpoint', 'cycle'))
+
+predictor = None
+btb = None
+pending = []
+
+predictions = 0
+mispredictions = 0
+squashed_instructions = 0
+recovered_cycles = 0
+# (seq, issued) for each squash an older pending branch may still cover:
+# instructions seq+1..issued are already counted as squashed
+squashed_ranges = []
+
+def make_predictor(name):
+    if name == "taken":
+        return StaticPredictor(True)
+    elif name == "not-taken":
+        return StaticPredictor(False)
+    elif name == "bimodal":
+        return BimodalPredictor(context.predictor_entries)
+    elif name == "gshare":
+        return GsharePredictor(context.predictor_entries, context.predictor_history_bits)
+    raise ValueError(f"Unknown branch predictor '{name}'")
+
+def initialize_branch_prediction():
+    global predictor, btb, pending, predictions, mispredictions, squashed_instructions, recovered_cycles
+    global squashed_ranges
+    predictor = None if context.branch_predictor is None else make_predictor(context.branch_predictor)
+    btb = BranchTargetBuffer(context.btb_entries)
+    pending = []
+    squashed_ranges = []
+    predictions = mispredictions = squashed_instructions = recovered_cycles = 0
+
+def predict(station, pc):
+    # called when BEQ/BNE `station` issues from `pc`; returns the pc to fetch next
+    global predictions
+    predictions += 1
+    taken = predictor.predict(pc)
+    target = btb.lookup(pc) if taken else None
+    if target is None:
+        taken = False
+    next_pc = target if taken else pc + 1
+
+    checkpoint = None if context.rob_entries else checkpoint_registers()
+    pending.append(PendingBranch(station, station.seq, pc, taken, next_pc, checkpoint, context.clock_cycle))
+    if tracer.issue >= tracer.INFO:
+        tracer.emit('issue', f"Predicted {'taken' if taken else 'not taken'} for branch at {pc}, "
+                             f"fetching from {next_pc}")
+    return next_pc
+
+def checkpoint_registers():
+    # register copies that keep receiving broadcasts of the older producers
+    # they wait on, so they are current when a misprediction restores them
+    checkpoint = []
+    for register in context.registers:
+        copy = context.Register(register.id, register.name)
+        copy.Value = register.Value
+        copy.Qi = register.Qi
+        if copy.Qi:
+            CDB.add_consumer(copy.Qi, copy, 'i')
+        checkpoint.append(copy)
+    return checkpoint
+
+def resolve(station, taken):
+    # without a reorder buffer this is always the oldest pending branch,
+    # since younger branches are held until it resolves
+    global mispredictions, recovered_cycles
+    index = next(index for index, record in enumerate(pending) if record.seq == station.seq)
+    record = pending.pop(index)
+    target = context.decoded_program[record.pc].target
+    predictor.update(record.pc, taken)
+    if taken:
+        btb.update(record.pc, target)
+
+    if taken == record.taken:
+        recovered_cycles += context.clock_cycle - record.cycle
+        if tracer.execute >= tracer.INFO:
+            tracer.emit('execute', f"Branch at {record.pc} correctly predicted")
+        return
+
+    mispredictions += 1
+    squash(record.seq)
+    if record.checkpoint is None:
+        rob.flush(record.seq)
+    else:
+        for register, saved in zip(context.registers, record.checkpoint):
+            register.Value = saved.Value
+            register.Qi = saved.Qi
+            if register.Qi:
+                CDB.add_consumer(register.Qi, register, 'i')
+    # every branch still pending is younger and was squashed with it
+    del pending[index:]
+    context.pc = target if taken else record.pc + 1
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Branch at {record.pc} mispredicted; resuming at {context.pc}")
+
+def squash(seq):
+    global squashed_instructions, squashed_ranges
+    for name in ('TBE_Queue', 'Execute_Queue', 'Ready_Queue', 'Waiting_Queue', 'Result_Queue'):
+        queue = getattr(cycles, name)
+        kept = [station for station in queue if station.seq <= seq]
+        for station in queue:
+            if station.seq > seq:
+                fetch.release_station(station)
+        queue.clear()
+        queue.extend(kept)
+    # wrong-path instructions that issued without a station (NOPs) are counted
+    # too; with a reorder buffer a younger branch can squash first, and what
+    # it squashed is not counted again here
+    squashed = context.issued_instructions - seq
+    for low, high in squashed_ranges:
+        if low > seq:
+            squashed -= high - low
+    oldest = min([seq] + [record.seq for record in pending if record.seq < seq])
+    squashed_ranges = [(low, high) for low, high in squashed_ranges if oldest <= low < seq]
+    squashed_ranges.append((seq, context.issued_instructions))
+    squashed_instructions += squashed
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Squashed {squashed} wrong-path instructions")
+
+def next_result():
+    # index in the Result queue of the oldest station allowed to write back
+    if not pending or context.rob_entries:
+        return 0
+    oldest = pending[0].seq
+    for index, station in enumerate(cycles.Result_Queue):
+        if station.seq <= oldest:
+            return index
+    return None
@@ -0,0 +1,275 @@
+import random
+from array import array
+from collections import deque
+
+import context
+import tracer
+
+# Set-associative data cache timing model. The cache only tracks tags; the
+# data itself always lives in context.data_memory. Each line has a slot
+# set_index * associativity + way in the arrays below.
+#
+# The timing model reaches the cache through request(). With mshr_entries
+# set, a miss holds a miss status holding register until its block has been
+# filled: a later access to that block merges into it and completes with the
+# fill, and a miss to another block is turned away while every register is
+# busy. With write_buffer_entries set, a store only takes a hit to enter a
+# coalescing write buffer of one entry per block, which drains into the
+# cache a block at a time in the background.
+
+num_sets = 0
+associativity = 1
+tags = array('q')
+valid = bytearray()
+dirty = bytearray()
+stamps = array('Q')   # last use (LRU) or fill time (FIFO)
+access_counter = 0
+rng = random.Random(0)
+
+hits = 0
+misses = 0
+evictions = 0
+writebacks = 0
+
+# block number -> cycle in which its fill has arrived
+mshrs = {}
+# blocks waiting to be written, oldest first, and the cycle in which the
+# first of them has been drained into the cache (0: not started)
+write_buffer = deque()
+drain_done = 0
+
+merged_misses = 0
+mshr_stall_cycles = 0
+mshr_occupancy = 0      # busy registers summed over cycles
+mshr_peak = 0
+coalesced_stores = 0
+write_buffer_stall_cycles = 0
+write_buffer_occupancy = 0
+write_buffer_peak = 0
+last_mshr_stall = -1
+last_write_buffer_stall = -1
+
+def initialize_cache():
+    global num_sets, associativity, tags, valid, dirty, stamps, access_counter, rng
+    global hits, misses, evictions, writebacks
+    global mshrs, write_buffer, drain_done, merged_misses, mshr_stall_cycles, mshr_occupancy, mshr_peak
+    global coalesced_stores, write_buffer_stall_cycles, write_buffer_occupancy, write_buffer_peak
+    global last_mshr_stall, last_write_buffer_stall
+
+    lines = context.cache_size // context.block_size
+    associativity = max(1, min(context.cache_associativity, lines))
+    if lines % associativity != 0:
+        raise ValueError(f"{lines} cache lines cannot be split into {associativity}-way sets")
+    if context.cache_replacement not in ("LRU", "FIFO", "RANDOM"):
+        raise ValueError(f"Unknown cache replacement policy '{context.cache_replacement}'")
+    num_sets = lines // associativity
+
+    tags = array('q', [0] * lines)
+    valid = bytearray(lines)
+    dirty = bytearray(lines)
+    stamps = array('Q', [0] * lines)
+    access_counter = 0
+    rng = random.Random(context.cache_seed)
+    hits = misses = evictions = writebacks = 0
+    mshrs = {}
+    write_buffer = deque()
+    drain_done = 0
+    merged_misses = mshr_stall_cycles = mshr_occupancy = mshr_peak = 0
+    coalesced_stores = write_buffer_stall_cycles = write_buffer_occupancy = write_buffer_peak = 0
+    last_mshr_stall = last_write_buffer_stall = -1
+
+    if tracer.setup >= tracer.INFO:
+        tracer.emit('setup', f"Cache: {lines} lines, {num_sets} sets, {associativity}-way, "
+                             f"{context.cache_replacement}, "
+                             f"{'write-back' if context.cache_write_back else 'write-through'}, "
+                             f"{'write-allocate' if context.cache_write_allocate else 'no-write-allocate'}")
+
+def split_address(address):
+    block_number = address // context.block_size
+    return block_number % num_sets, block_number // num_sets
+
+def find_line(set_index, tag):
+    first = set_index * associativity
+    for slot in range(first, first + associativity):
+        if valid[slot] and tags[slot] == tag:
+            return slot
+    return -1
+
+def choose_victim(set_index):
+    first = set_index * associativity
+    for slot in range(first, first + associativity):
+        if not valid[slot]:
+            return slot
+    if context.cache_replacement == "RANDOM":
+        return first + rng.randrange(associativity)
+    # LRU and FIFO both evict the smallest stamp; they differ in when it is updated
+    victim = first
+    for slot in range(first + 1, first + associativity):
+        if stamps[slot] < stamps[victim]:
+            victim = slot
+    return victim
+
+def fill_line(set_index, tag):
+    global evictions, writebacks
+    latency = context.cache_miss_penalty
+    slot = choose_victim(set_index)
+    if valid[slot]:
+        evictions += 1
+        if dirty[slot]:
+            writebacks += 1
+            latency += context.cache_miss_penalty
+    tags[slot] = tag
+    valid[slot] = 1
+    dirty[slot] = 0
+    stamps[slot] = access_counter
+    return slot, latency
+
+def access(address, is_write=False):
+    global access_counter, hits, misses
+    access_counter += 1
+    set_index, tag = split_address(address)
+    slot = find_line(set_index, tag)
+    latency = context.cache_hit_latency
+
+    if slot >= 0:
+        hits += 1
+        if context.cache_replacement == "LRU":
+            stamps[slot] = access_counter
+        hit = True
+    else:
+        misses += 1
+        hit = False
+        if not is_write or context.cache_write_allocate:
+            slot, penalty = fill_line(set_index, tag)
+            latency += penalty
+        else:
+            latency += context.cache_miss_penalty
+
+    if is_write and slot >= 0:
+        if context.cache_write_back:
+            dirty[slot] = 1
+        else:
+            latency += context.cache_miss_penalty
+
+    if tracer.memory >= tracer.DEBUG:
+        tracer.emit('memory', f"Cache {'write' if is_write else 'read'} at {address}: "
+                              f"{'hit' if hit else 'miss'} (set {set_index}, tag {tag}), latency {latency}")
+    return latency
+
+def request(address, is_write=False):
+    # the access time of a load or store starting this cycle, or None if the
+    # cache cannot take it yet
+    if is_write and context.write_buffer_entries:
+        return buffer_store(address)
+    if not context.mshr_entries:
+        return access(address, is_write)
+    return request_block(address, is_write)
+
+def request_block(address, is_write):
+    global merged_misses, mshr_stall_cycles, last_mshr_stall
+    if not context.mshr_entries:
+        return access(address, is_write)
+    now = context.clock_cycle
+    block = address // context.block_size
+    fill = mshrs.get(block, 0)
+    if fill > now:
+        merged_misses += 1
+        if tracer.memory >= tracer.DEBUG:
+            tracer.emit('memory', f"Access at {address} merged into the miss on block {block}")
+        return max(context.cache_hit_latency, fill - now)
+    if len(mshrs) >= context.mshr_entries:
+        release_mshrs()
+        if len(mshrs) >= context.mshr_entries and find_line(*split_address(address)) < 0:
+            if last_mshr_stall != now:
+                last_mshr_stall = now
+                mshr_stall_cycles += 1
+            if tracer.memory >= tracer.INFO:
+                tracer.emit('memory', f"All {context.mshr_entries} MSHRs busy; access at {address} waits")
+            return None
+    filled = misses
+    latency = access(address, is_write)
+    if misses != filled and (not is_write or context.cache_write_allocate):
+        mshrs[block] = now + latency
+    return latency
+
+def release_mshrs():
+    now = context.clock_cycle
+    for block in [block for block, fill in mshrs.items() if fill <= now]:
+        del mshrs[block]
+
+def buffer_store(address):
+    global coalesced_stores, write_buffer_stall_cycles, last_write_buffer_stall
+    block = address // context.block_size
+    # the entry being drained can no longer take data
+    waiting = list(write_buffer)[1:] if drain_done else write_buffer
+    if block in waiting:
+        coalesced_stores += 1
+        if tracer.memory >= tracer.DEBUG:
+            tracer.emit('memory', f"Store at {address} coalesced into the write buffer entry for block {block}")
+    elif len(write_buffer) >= context.write_buffer_entries:
+        if last_write_buffer_stall != context.clock_cycle:
+            last_write_buffer_stall = context.clock_cycle
+            write_buffer_stall_cycles += 1
+        if tracer.memory >= tracer.INFO:
+            tracer.emit('memory', f"Write buffer full; store at {address} waits")
+        return None
+    else:
+        write_buffer.append(block)
+    return context.cache_hit_latency
+
+def memory_cycle():
+    # frees the MSHRs whose fills have arrived, starts draining the oldest
+    # write buffer entry and samples occupancy
+    global drain_done, mshr_occupancy, mshr_peak, write_buffer_occupancy, write_buffer_peak
+    now = context.clock_cycle
+    if mshrs:
+        release_mshrs()
+    if drain_done and drain_done <= now:
+        write_buffer.popleft()
+        drain_done = 0
+    if write_buffer and not drain_done:
+        latency = request_block(write_buffer[0] * context.block_size, True)
+        if latency is not None:
+            drain_done = now + latency
+            if tracer.memory >= tracer.DEBUG:
+                tracer.emit('memory', f"Draining block {write_buffer[0]} from the write buffer, {latency} cycles")
+    mshr_occupancy += len(mshrs)
+    mshr_peak = max(mshr_peak, len(mshrs))
+    write_buffer_occupancy += len(write_buffer)
+    write_buffer_peak = max(write_buffer_peak, len(write_buffer))
+
+def next_event():
+    # the first cycle in which the MSHRs or the write buffer change without
+    # an access, or None
+    if write_buffer and not drain_done:
+        return context.clock_cycle + 1
+    events = list(mshrs.values())
+    if drain_done:
+        events.append(drain_done)
+    return min(events) if events else None
+
+def skip(count):
+    # occupancy over `count` cycles in which next_event() does not happen
+    global mshr_occupancy, mshr_peak, write_buffer_occupancy, write_buffer_peak
+    mshr_occupancy += count * len(mshrs)
+    mshr_peak = max(mshr_peak, len(mshrs))
+    write_buffer_occupancy += count * len(write_buffer)
+    write_buffer_peak = max(write_buffer_peak, len(write_buffer))
+
+def summary():
+    total = hits + misses
+    rate = hits / total if total else 0.0
+    return (f"Cache accesses: {total}, hits: {hits}, misses: {misses}, hit rate: {rate:.2%}, "
+            f"evictions: {evictions}, dirty writebacks: {writebacks}")
+
+def parallelism_summary(cycles):
+    lines = []
+    if context.mshr_entries:
+        lines.append(f"MSHRs: {context.mshr_entries}, merged misses: {merged_misses}, "
+                     f"average occupancy: {mshr_occupancy / cycles if cycles else 0.0:.2f}, "
+                     f"peak: {mshr_peak}, MSHR-full stall cycles: {mshr_stall_cycles}")
+    if context.write_buffer_entries:
+        lines.append(f"Write buffer: {context.write_buffer_entries} entries, coalesced stores: {coalesced_stores}, "
+                     f"average occupancy: {write_buffer_occupancy / cycles if cycles else 0.0:.2f}, "
+                     f"peak: {write_buffer_peak}, buffer-full stall cycles: {write_buffer_stall_cycles}")
+    return '\n'.join(lines)
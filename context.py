@@ -1,37 +1,14 @@
-isa = {
-    'LW': 1,
-    'LD': 2,
-    'L.W': 3,
-    'L.D': 4,
-    'SW': 5,
-    'SD': 6,
-    'S.W': 7,
-    'S.D': 8,
-    
-    'ADD': 9,
-    'DADDI': 10,
-    'SUB': 11,
-    'DSUBI': 12,
-    'MUL': 13,
-    'DIV': 14,
-    
-    'ADD.D': 15,
-    'ADD.S': 16,
-    'SUB.D': 17,
-    'SUB.S': 18,
-    'MUL.D': 19,
-    'MUL.S': 20,
-    'DIV.D': 21,
-    'DIV.S': 22,
-    
-    'J': 23,
-    'JR': 24,
-    'JAL': 25,
-    'BEQ': 26,
-    'BNE': 27,
-    
-    'NOP': 0
-}
+import mmap
+
+import branch
+import cache
+import fetch
+import lsq
+import opcodes
+import rob
+import tracer
+
+isa = {row.name: row.opcode for row in opcodes.TABLE}
 
 
 pc = 0
@@ -43,16 +20,57 @@ block_size = 4
 cache_lines = cache_size // block_size
 cache_hit_latency = 1
 cache_miss_penalty = 10
+cache_associativity = 1
+cache_replacement = "LRU"       # LRU, FIFO or RANDOM
+cache_write_back = True         # False: write-through
+cache_write_allocate = True
+cache_seed = 0
 
 fp_add_latency = 2
 fp_mult_latency = 10
 fp_div_latency = 40
-load_latency = 2
-store_latency = 2
 add_latency = 1
+branch_latency = 1
+
+# jump the clock over cycles where only executing stations count down
+skip_idle_cycles = True
+
+# None stalls fetch on every branch; "taken", "not-taken", "bimodal" or
+# "gshare" predicts BEQ/BNE and issues speculatively (see branch.py)
+branch_predictor = None
+predictor_entries = 1024
+predictor_history_bits = 8
+btb_entries = 64
+
+# 0 lets results update the registers straight from the CDB; otherwise the
+# size of the reorder buffer that commits them in order (see rob.py)
+rob_entries = 0
+commit_width = 1
+
+# loads take data from an older store to the same address in this many
+# cycles; with load_bypass they may also start before older store
+# addresses are known and are replayed if one turns out to match (see lsq.py)
+store_forward_latency = 1
+load_bypass = False
+
+# 0 leaves misses unlimited and independent; otherwise the number of miss
+# status holding registers, which bound the misses in flight and merge
+# misses to the same block. A nonzero write_buffer_entries lets stores
+# retire into a coalescing write buffer instead of accessing the cache
+# (see cache.py)
+mshr_entries = 0
+write_buffer_entries = 0
 
 instruction_memory = []
-data_memory = []
+decoded_program = []
+data_memory = bytearray()
+data_view = memoryview(data_memory)
+data_memory_size = None
+data_memory_image = None            # path of a binary image to mmap as data memory
+data_memory_write_through = False   # True: stores go to the image file, False: copy-on-write
+
+# little-endian layout of each load/store opcode's operand in data memory
+memory_formats = {row.opcode: row.layout for row in opcodes.TABLE if row.layout is not None}
 
 tag = 0
 index = 0
@@ -75,31 +93,92 @@ CDB = {
 }
 
 STALL = False
+branch_stall_cycles = 0
+structural_stall_cycles = 0
+issued_instructions = 0
 
 # ------------------------------------------------------------------- #
 
-g, f = 32, 32
+class ReservationStation:
+    __slots__ = ('id', 'name', 'unit', 'slot', 'time', 'busy', 'op', 'Vj', 'Vk', 'Qj', 'Qk', 'A', 'state', 'seq', 'dest')
 
-general_registers = {}    
-floating_point_registers = {}
+    def __init__(self, id, name, unit, slot):
+        self.id = id
+        self.name = name
+        self.unit = unit
+        self.slot = slot
+        self.time = 0
+        self.busy = 0
+        self.op = None
+        self.Vj = 0
+        self.Vk = 0
+        self.Qj = 0
+        self.Qk = 0
+        self.A = ""
+        self.state = "free"
+        self.seq = 0    # issue order of the instruction it holds
+        self.dest = 0   # tag its result is broadcast under: its id, or its reorder buffer entry
 
-for i in range(g):
-    general_registers[f"R{i}"] = {
-        "Value": 0.0,
-        "Qi": "0",
-}
-for i in range(f):
-    floating_point_registers[f"F{i}"] = {
-        "Value": 0.0,
-        "Qi": "0",
-}
+    def __repr__(self):
+        return (f"{{'time': {self.time}, 'busy': {self.busy}, 'op': {self.op}, "
+                f"'Vj': {self.Vj!r}, 'Vk': {self.Vk!r}, 'Qj': '{tag_name(self.Qj)}', "
+                f"'Qk': '{tag_name(self.Qk)}', 'A': {self.A!r}, 'state': '{self.state}'}}")
+
+class Register:
+    __slots__ = ('id', 'name', 'Value', 'Qi')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.Value = 0.0
+        self.Qi = 0
+
+    def __repr__(self):
+        return f"{{'Value': {self.Value!r}, 'Qi': '{tag_name(self.Qi)}'}}"
+
+# functional units; a station's unit indexes unit_prefixes
+ADDER, MULT, FP_ADDER, FP_MULT, LOAD, STORE = opcodes.UNITS
+unit_prefixes = ('A', 'M', 'FA', 'FM', 'L', 'S')
+
+# Tags (Qj, Qk, Qi, CDB tag) are station ids. Id 0 means "no producer", so
+# stations[0] is a placeholder and real stations start at 1.
+stations = [None]
+station_ids = {}
+
+# per unit: the unit's stations by slot, and a bitmap with bit `slot` set
+# while that station is free
+unit_stations = [[] for _ in unit_prefixes]
+free_masks = [0 for _ in unit_prefixes]
+
+# register id = index into registers; R0..R(g-1) come first, then F0..F(f-1)
+registers = []
+register_ids = {}
+general_registers = []
+floating_point_registers = []
 
-adder_reservation_stations = {}
-fp_adder_reservation_stations = {}
-mult_reservation_stations = {}
-fp_mult_reservation_stations = {}
-load_buffers = {}
-store_buffers = {}
+adder_reservation_stations = []
+fp_adder_reservation_stations = []
+mult_reservation_stations = []
+fp_mult_reservation_stations = []
+load_buffers = []
+store_buffers = []
+
+def tag_name(tag):
+    if tag == 0:
+        return '0'
+    if rob.is_tag(tag):
+        return rob.entry(tag).name
+    return stations[tag].name
+
+def initialize_registers(g=32, f=32):
+    global registers, register_ids, general_registers, floating_point_registers
+    names = [f"R{i}" for i in range(g)] + [f"F{i}" for i in range(f)]
+    registers = [Register(i, name) for i, name in enumerate(names)]
+    register_ids = {name: i for i, name in enumerate(names)}
+    general_registers = registers[:g]
+    floating_point_registers = registers[g:]
+
+initialize_registers()
 
 # ------------------------------------------------------------------- #
 
@@ -111,142 +190,136 @@ def open_instruction_file(file_path):
     return instructions
 
 def initialize_data_memory(size=None):
-    global data_memory
+    global data_memory, data_view
+    release_data_memory()
+    if data_memory_image is not None:
+        map_data_memory(data_memory_image, data_memory_write_through)
+        return
+    if size is None:
+        size = data_memory_size
     if size is None:
         num_cache_blocks = cache_size // block_size
         memory_blocks = num_cache_blocks * 16
         size = memory_blocks * block_size
     
-    data_memory = [0] * size
-    print(f"Data memory initialized: {size} bytes")
-    print(f"Cache configuration: {cache_size} bytes, {block_size} bytes per block")
-    print(f"Number of cache blocks: {cache_size // block_size}")
+    data_memory = bytearray(size)
+    data_view = memoryview(data_memory)
+    if tracer.setup >= tracer.INFO:
+        tracer.emit('setup', f"Data memory initialized: {size} bytes")
+        tracer.emit('setup', f"Cache configuration: {cache_size} bytes, {block_size} bytes per block")
+        tracer.emit('setup', f"Number of cache blocks: {cache_size // block_size}")
+
+def map_data_memory(path, write_through=False):
+    global data_memory, data_view
+    access = mmap.ACCESS_WRITE if write_through else mmap.ACCESS_COPY
+    with open(path, 'r+b' if write_through else 'rb') as file:
+        data_memory = mmap.mmap(file.fileno(), 0, access=access)
+    data_view = memoryview(data_memory)
+    if tracer.setup >= tracer.INFO:
+        tracer.emit('setup', f"Data memory mapped from {path}: {len(data_memory)} bytes, "
+                             f"{'write-through' if write_through else 'copy-on-write'}")
+
+def flush_data_memory():
+    if isinstance(data_memory, mmap.mmap) and data_memory_write_through:
+        data_memory.flush()
+
+def release_data_memory():
+    global data_memory, data_view
+    data_view.release()
+    if isinstance(data_memory, mmap.mmap):
+        flush_data_memory()
+        data_memory.close()
+    data_memory = bytearray()
+    data_view = memoryview(data_memory)
+
+def load_data_memory(data, address=0):
+    data = memoryview(data).cast('B')
+    if address < 0 or address + len(data) > len(data_memory):
+        raise IndexError(f"Cannot load {len(data)} bytes at address {address} into {len(data_memory)} bytes of data memory")
+    data_view[address:address + len(data)] = data
+
+def dump_data_memory(address=0, length=None):
+    if length is None:
+        length = len(data_memory) - address
+    return data_view[address:address + length]
 
 def load_instruction_memory(instructions):
-    global instruction_memory
+    global instruction_memory, decoded_program
 
     instruction_memory = instructions
+    decoded_program = fetch.decode_program(instructions)
+    if tracer.setup >= tracer.INFO:
+        tracer.emit('setup', f"Decoded {len(decoded_program)} instructions")
     
-def initialize_reservation_stations(g = 32, f= 32, a=3, fa=3, m=2, fm=2, l=3, s=3):
+def initialize_reservation_stations(a=3, fa=3, m=2, fm=2, l=3, s=3):
+    global stations, station_ids, unit_stations, free_masks
     global adder_reservation_stations, fp_adder_reservation_stations
     global mult_reservation_stations, fp_mult_reservation_stations
     global load_buffers, store_buffers
-    global floating_point_registers, general_registers
-    
-    for i in range(a):
-        name = f"A{i+1}"
-
-        adder_reservation_stations[name] = {
-            "time": 0,
-            "busy": 0,
-            "op": None,
-            "Vj": 0,
-            "Vk": 0,
-            "Qj": "0",
-            "Qk": "0",
-            "A":  "",
-        }  
-        
-    for i in range(fa):
-        name = f"FA{i+1}"
-
-        fp_adder_reservation_stations[name] = {
-            "time": 0,
-            "busy": 0,
-            "op": None,
-            "Vj": 0.0,
-            "Vk": 0.0,
-            "Qj": "0",
-            "Qk": "0",
-            "A":  "",
-        }
-        
-    for i in range(m):
-        name = f"M{i+1}"
-
-        mult_reservation_stations[name] = {
-            "time": 0,
-            "busy": 0,
-            "op": None,
-            "Vj": 0,
-            "Vk": 0,
-            "Qj": "0",
-            "Qk": "0",
-            "A":  "",        
-        }
-        
-    for i in range(fm):
-        name = f"FM{i+1}"
-
-        fp_mult_reservation_stations[name] = {
-            "time": 0,
-            "busy": 0,
-            "op": None,
-            "Vj": 0.0,
-            "Vk": 0.0,
-            "Qj": "0",
-            "Qk": "0",
-            "A":  "",
-        }
-        
-    for i in range(l):
-        name = f"L{i+1}"
-        
-        load_buffers[name] = {
-            'time': 0,
-            "busy": 0,
-            "op": None,
-            "Vj": 0.0,
-            "Vk": 0.0,
-            "Qj": "0",
-            "Qk": "0",
-            "A":  "",
-        }
-        
-    for i in range(s):
-        name = f"S{i+1}"
-        
-        store_buffers[name] = {
-            'time': 0,
-            "busy": 0,
-            "op": None,
-            "Vj": 0.0,
-            "Vk": 0.0,
-            "Qj": "0",
-            "Qk": "0",
-            "A":  "",
-        }
+
+    stations = [None]
+    station_ids = {}
+    units = []
+    for unit, count in enumerate((a, m, fa, fm, l, s)):
+        stations_of_unit = []
+        for i in range(count):
+            station = ReservationStation(len(stations), f"{unit_prefixes[unit]}{i+1}", unit, i)
+            stations.append(station)
+            station_ids[station.name] = station.id
+            stations_of_unit.append(station)
+        units.append(stations_of_unit)
+    unit_stations = units
+    free_masks = [(1 << len(members)) - 1 for members in units]
+
+    (adder_reservation_stations, mult_reservation_stations,
+     fp_adder_reservation_stations, fp_mult_reservation_stations,
+     load_buffers, store_buffers) = units
         
 def initialize_clock_cycle():
-    global clock_cycle
+    global clock_cycle, branch_stall_cycles, structural_stall_cycles, issued_instructions
     clock_cycle = 0
+    branch_stall_cycles = 0
+    structural_stall_cycles = 0
+    issued_instructions = 0
     
 def initialize_program_counter():
-    global pc
+    global pc, STALL
     pc = 0
+    STALL = False
     
 def increment_pc(offset):
     global pc
     pc += offset
     
-def initialize_simulator(instruction_file_path):
-    instructions = open_instruction_file(instruction_file_path)
+def initialize_simulator(program, stations=None):
+    # program is an instruction file path or a list of instruction lines
+    if isinstance(program, str):
+        instructions = open_instruction_file(program)
+    else:
+        instructions = [line.strip() for line in program if line.strip()]
     load_instruction_memory(instructions)
     initialize_data_memory()
+    cache.initialize_cache()
+    branch.initialize_branch_prediction()
     initialize_clock_cycle()
     initialize_program_counter()
-    initialize_reservation_stations()
+    initialize_reservation_stations(**(stations or {}))
+    rob.initialize_reorder_buffer()
+    lsq.initialize_lsq()
     
-    print("Simulator initialized.")
+    if tracer.setup >= tracer.INFO:
+        tracer.emit('setup', "Simulator initialized.")
 
         
 def stall_pipeline():
     global STALL
     STALL = True
-    print("Pipeline stalled.")
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', "Pipeline stalled.")
     
 def unstall_pipeline():
     global STALL
     STALL = False
-    print("Pipeline unstalled.")
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', "Pipeline unstalled.")
     
\ No newline at end of file
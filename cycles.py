@@ -1,305 +1,443 @@
+from collections import deque
+
+import branch
+import cache
 import context
 import fetch
 import execute
+import lsq
+import rob
 import wb
 import CDB
+import tracer
+
+# each queue holds stations; station.state records which queue the station
+# is in so no stage has to search the queues
+TBE_Queue = deque()
+Execute_Queue = deque()
+Ready_Queue = deque()
+Waiting_Queue = deque()
+Result_Queue = deque()
+Clear_Queue = deque()
+
+# Per-cycle state output: "diff" prints only the stations, registers, memory
+# words and queues that changed since the last print, "full" the complete
+# dump every cycle. With full_state_interval set, diff mode still prints a
+# full dump every that many cycles.
+state_output = "diff"
+full_state_interval = 0
+
+# what was last printed, to diff against
+last_stations = {}
+last_registers = {}
+last_queues = {}
+memory_writes = []
+
+def initialize_queues():
+    global TBE_Queue, Execute_Queue, Ready_Queue, Waiting_Queue, Result_Queue, Clear_Queue
+    global last_stations, last_registers, last_queues, memory_writes
+    TBE_Queue = deque()
+    Execute_Queue = deque()
+    Ready_Queue = deque()
+    Waiting_Queue = deque()
+    Result_Queue = deque()
+    Clear_Queue = deque()
+    last_stations = {}
+    last_registers = {}
+    last_queues = {}
+    memory_writes = []
+
+def format_entries(entries):
+    return str({entry.name: entry for entry in entries})
 
-TBE_Queue = []
-Execute_Queue = []
-Ready_Queue = []
-Waiting_Queue = []
-Result_Queue = []
-Clear_Queue = []
+def format_queue(queue):
+    return str([station.name for station in queue])
 
 def print_state():
-    print('\n')
-    print(f"State of Load buffers: {context.load_buffers}")
-    print('\n')
-    print(f"State of Store buffers: {context.store_buffers}")
-    print('\n')
-    print(f"State of integer adder reservation stations: {context.adder_reservation_stations}")
-    print('\n')
-    print(f"State of integer multiplier reservation stations: {context.mult_reservation_stations}")
-    print('\n')
-    print(f"State of floating adder reservation stations: {context.fp_adder_reservation_stations}")
-    print ('\n')
-    print(f'State of floating multiplier reservation stations: {context.fp_mult_reservation_stations}')
-    print('\n')
-    print(f"State of floating registers: {context.floating_point_registers}")
-    print('\n')
-    print(f"State of registers: {context.general_registers}")
-    print('\n')
+    tracer.emit('state', '\n'.join((
+        '',
+        f"State of Load buffers: {format_entries(context.load_buffers)}",
+        '',
+        f"State of Store buffers: {format_entries(context.store_buffers)}",
+        '',
+        f"State of integer adder reservation stations: {format_entries(context.adder_reservation_stations)}",
+        '',
+        f"State of integer multiplier reservation stations: {format_entries(context.mult_reservation_stations)}",
+        '',
+        f"State of floating adder reservation stations: {format_entries(context.fp_adder_reservation_stations)}",
+        '',
+        f'State of floating multiplier reservation stations: {format_entries(context.fp_mult_reservation_stations)}',
+        '',
+        f"State of floating registers: {format_entries(context.floating_point_registers)}",
+        '',
+        f"State of registers: {format_entries(context.general_registers)}",
+        '',
+    )))
 
+def collect_state_changes():
+    lines = []
+    for station in context.stations[1:]:
+        fields = (station.time, station.busy, station.op, station.Vj, station.Vk,
+                  station.Qj, station.Qk, station.A, station.state)
+        if last_stations.get(station.id) != fields:
+            last_stations[station.id] = fields
+            lines.append(f"  {station.name:<6} time={station.time} busy={station.busy} op={station.op} "
+                         f"Vj={station.Vj!r} Vk={station.Vk!r} Qj={context.tag_name(station.Qj)} "
+                         f"Qk={context.tag_name(station.Qk)} A={station.A!r} state={station.state}")
+    for register in context.registers:
+        fields = (register.Value, register.Qi)
+        if last_registers.get(register.id) != fields:
+            last_registers[register.id] = fields
+            lines.append(f"  {register.name:<6} Value={register.Value!r} Qi={context.tag_name(register.Qi)}")
+    for address, opcode in memory_writes:
+        lines.append(f"  M[{address}] {fetch.get_from_memory(address, opcode)!r}")
+    memory_writes.clear()
+    return lines
+
+def print_cycle_state():
+    if state_output == "full" or (full_state_interval and context.clock_cycle % full_state_interval == 0):
+        collect_state_changes()
+        print_state()
+        return
+    lines = collect_state_changes()
+    tracer.emit('state', '\n'.join([f"Changed in cycle {context.clock_cycle}:"] + (lines or ["  nothing"])))
+
+def print_queues():
+    tracer.emit('state', '\n'.join((
+        'Current To Be Executed Queue:',
+        format_queue(TBE_Queue),
+        '',
+        'Current Execute Queue:',
+        format_queue(Execute_Queue),
+        '',
+        'Current Ready Queue:',
+        format_queue(Ready_Queue),
+        '',
+        'Current Waiting Queue:',
+        format_queue(Waiting_Queue),
+        '',
+        'Current Result Queue:',
+        format_queue(Result_Queue),
+        '',
+        'Current Clear Queue:',
+        format_queue(Clear_Queue),
+        '',
+    )))
+    if context.rob_entries:
+        tracer.emit('state', f"Current Reorder Buffer:\n{rob.describe()}\n")
+
+
+def print_queue_changes():
+    lines = []
+    for name, queue in (('To Be Executed', TBE_Queue), ('Execute', Execute_Queue), ('Ready', Ready_Queue),
+                        ('Waiting', Waiting_Queue), ('Result', Result_Queue), ('Clear', Clear_Queue)):
+        members = tuple(station.id for station in queue)
+        if last_queues.get(name) != members:
+            last_queues[name] = members
+            lines.append(f"  {name} Queue: {format_queue(queue)}")
+    if context.rob_entries:
+        members = tuple((entry.id, entry.ready) for entry in rob.live_entries())
+        if last_queues.get('Reorder Buffer') != members:
+            last_queues['Reorder Buffer'] = members
+            lines.append(f"  Reorder Buffer: {rob.describe()}")
+    if lines:
+        tracer.emit('state', '\n'.join(['Queues changed:'] + lines))
 
 def increment_cycle():
     context.clock_cycle += 1
     
-    print('----------------------------------------')
-    print('\n')
-    print(f"Cycle: {context.clock_cycle}")
-    print('\n')
-    print('----------------------------------------')
-    print('\n')
+    if tracer.cycle >= tracer.INFO:
+        tracer.emit('cycle', '\n'.join((
+            '----------------------------------------',
+            '',
+            f"Cycle: {context.clock_cycle}",
+            '',
+            '----------------------------------------',
+        )))
     
     
 def fetch_cycle_helper():
     instruction = fetch.get_current_instruction()
     if instruction:
-        print(f"Fetched instruction: {instruction}")
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', f"Fetched instruction: {instruction.text}")
         return instruction
     elif context.STALL == True:
-        print("Pipeline is Stalled. No instruction fetched.")
+        context.branch_stall_cycles += 1
+        if tracer.issue >= tracer.DEBUG:
+            tracer.emit('issue', "Pipeline is Stalled. No instruction fetched.")
         return None
     else:
-        print("No more instructions to fetch.")
+        if tracer.issue >= tracer.DEBUG:
+            tracer.emit('issue', "No more instructions to fetch.")
         return None
     
 def fetch_cycle():
-    print('Start of Fetch Cycle')
-    print('\n')
-    print(f'PC at start of fetch: {context.pc}')
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', 'Start of Fetch Cycle')
+        tracer.emit('issue', f'PC at start of fetch: {context.pc}')
 
     instruction = fetch_cycle_helper()
-    if instruction is not None:
-        decoded_instruction = fetch.decode_instruction(instruction)
-        print(f"Decoded instruction: {decoded_instruction}")
-        fetch.write_to_reservation_station(decoded_instruction)
+    stall = issue_stall(instruction) if instruction is not None else None
+    if stall == 'structural':
+        # structural hazard: hold the instruction at the PC until a station frees up
+        context.structural_stall_cycles += 1
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', f"No free station for '{instruction.text}'; issue stalled")
+    elif stall == 'rob':
+        rob.full_stall_cycles += 1
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', f"Reorder buffer full; '{instruction.text}' not issued")
+    elif instruction is not None:
+        issued = fetch.write_to_reservation_station(instruction)
+        context.issued_instructions += 1
+        if issued is not None:
+            issued.seq = context.issued_instructions
+            if context.rob_entries:
+                rob.fill(issued, None if issued.unit == context.STORE else instruction.rd)
         if context.STALL == True:
-            print("Pipeline is Stalled.")
+            if tracer.issue >= tracer.DEBUG:
+                tracer.emit('issue', "Pipeline is Stalled.")
+        elif branch.predictor is not None and instruction.opcode in fetch.branch_opcodes:
+            context.pc = branch.predict(issued, context.pc)
         else:
             context.increment_pc(1)
-        print(f'PC after fetch: {context.pc}')
-        print('End of Fetch Cycle')
+        if tracer.issue >= tracer.DEBUG:
+            tracer.emit('issue', f'PC after fetch: {context.pc}')
+            tracer.emit('issue', 'End of Fetch Cycle')
         
-    for name, station in context.adder_reservation_stations.items():
-        if station["busy"] == 1 and (name, station) not in TBE_Queue \
-        and (name, station) not in Execute_Queue \
-        and (name, station) not in Ready_Queue \
-        and (name, station) not in Waiting_Queue \
-        and (name, station) not in Result_Queue \
-        and (name, station) not in Clear_Queue:
-            TBE_Queue.append((name, station))
-            print(f'Added {name} to To Be Executed Queue')
-            
-    for name, station in context.mult_reservation_stations.items():
-        if station["busy"] == 1 and (name, station) not in TBE_Queue \
-        and (name, station) not in Execute_Queue \
-        and (name, station) not in Ready_Queue \
-        and (name, station) not in Waiting_Queue \
-        and (name, station) not in Result_Queue \
-        and (name, station) not in Clear_Queue:
-            TBE_Queue.append((name, station))
-            print(f'Added {name} to To Be Executed Queue')   
-    
-    for name, station in context.fp_adder_reservation_stations.items():
-        if station["busy"] == 1 and (name, station) not in TBE_Queue \
-        and (name, station) not in Execute_Queue \
-        and (name, station) not in Ready_Queue \
-        and (name, station) not in Waiting_Queue \
-        and (name, station) not in Result_Queue \
-        and (name, station) not in Clear_Queue:
-            TBE_Queue.append((name, station))
-            print(f'Added {name} to To Be Executed Queue')
-    
-    for name, station in context.fp_mult_reservation_stations.items():
-        if station["busy"] == 1 and (name, station) not in TBE_Queue \
-        and (name, station) not in Execute_Queue \
-        and (name, station) not in Ready_Queue \
-        and (name, station) not in Waiting_Queue \
-        and (name, station) not in Result_Queue \
-        and (name, station) not in Clear_Queue:
-            TBE_Queue.append((name, station))
-            print(f'Added {name} to To Be Executed Queue')
-            
-    for name, station in context.load_buffers.items():
-        if station["busy"] == 1 and (name, station) not in TBE_Queue \
-        and (name, station) not in Execute_Queue \
-        and (name, station) not in Ready_Queue \
-        and (name, station) not in Waiting_Queue \
-        and (name, station) not in Result_Queue \
-        and (name, station) not in Clear_Queue:
-            TBE_Queue.append((name, station))
-            print(f'Added {name} to To Be Executed Queue')
-            
-    for name, station in context.store_buffers.items():
-        if station["busy"] == 1 and (name, station) not in TBE_Queue \
-        and (name, station) not in Execute_Queue \
-        and (name, station) not in Ready_Queue \
-        and (name, station) not in Waiting_Queue \
-        and (name, station) not in Result_Queue \
-        and (name, station) not in Clear_Queue:
-            TBE_Queue.append((name, station))
-            print(f'Added {name} to To Be Executed Queue')
+        if issued is not None:
+            TBE_Queue.append(issued)
+            if tracer.issue >= tracer.DEBUG:
+                tracer.emit('issue', f'Added {issued.name} to To Be Executed Queue')
             
     
-    print('Current To Be Executed Queue:')
-    print(TBE_Queue)
-    print('\n')
-    print('Current Execute Queue:')
-    print(Execute_Queue)
-    print('\n')
-    print('Current Ready Queue:')
-    print(Ready_Queue)
-    print('\n')
-    print('Current Waiting Queue:')
-    print(Waiting_Queue)
-    print('\n')
-    print('Current Result Queue:')
-    print(Result_Queue)
-    print('\n')
-    print('Current Clear Queue:')
-    print(Clear_Queue)
-    print('\n')
+    if tracer.state >= tracer.DEBUG:
+        if state_output == "full":
+            print_queues()
+        else:
+            print_queue_changes()
     
+def issue_stall(instruction):
+    # why `instruction` cannot issue this cycle: 'structural', 'rob' or None
+    unit = fetch.unit_for_opcode(instruction.opcode)
+    if unit is None:
+        return None
+    if context.free_masks[unit] == 0:
+        return 'structural'
+    if context.rob_entries and rob.full():
+        return 'rob'
+    return None
+
+def operands_ready(station):
+    if station.Qj != 0 or station.Qk != 0:
+        return False
+    # loads and stores also wait for older accesses to their bytes (see lsq.py)
+    if station.unit == context.LOAD:
+        return lsq.load_ready(station)
+    if station.unit == context.STORE:
+        return lsq.store_ready(station)
+    return True
+
+def start_execution(station):
+    # False if the cache cannot take the access yet (see cache.request)
+    if station.unit == context.LOAD or station.unit == context.STORE:
+        address = int(station.Vj) + int(station.A)
+        time = lsq.start_load(station) if station.unit == context.LOAD else None
+        if time is None:
+            time = cache.request(address, is_write=(station.unit == context.STORE))
+            if time is None:
+                return False
+        station.A = address
+        station.time = time
+        if station.unit == context.LOAD:
+            lsq.read_load(station)
+    station.state = 'executing'
+    Execute_Queue.append(station)
+    return True
+
 def execute_cycle():
-    for name, station in list(Ready_Queue):
-        Execute_Queue.append((name, station))
-        Ready_Queue.remove((name, station))
-        print(f'Station {name} moved from Ready to Execute Queue')
+    for _ in range(len(Ready_Queue)):
+        station = Ready_Queue.popleft()
+        if not start_execution(station):
+            Ready_Queue.append(station)
+        elif tracer.execute >= tracer.DEBUG:
+            tracer.emit('execute', f'Station {station.name} moved from Ready to Execute Queue')
     
-    for name, station in list(TBE_Queue):
-        if name.startswith('FA') or name.startswith('FM'):
-            if station['Qj'] in (0, '0') and station['Qk'] in (0, '0'):
-                Execute_Queue.append((name, station))
-                TBE_Queue.remove((name, station))
-            else:
-                Waiting_Queue.append((name, station))
-                TBE_Queue.remove((name, station))
-        elif name.startswith('L'):
-            Execute_Queue.append((name, station))
-            TBE_Queue.remove((name, station))
-        elif name.startswith('S'):
-            if station['Qj'] == '0':
-                Execute_Queue.append((name, station))
-                TBE_Queue.remove((name, station))
-            else:
-                Waiting_Queue.append((name, station))
-                TBE_Queue.remove((name, station))
-        
-        if name.startswith('A') or name.startswith('M'):
-            if station['Qj'] in (0, '0') and station['Qk'] in (0, '0'):
-                Execute_Queue.append((name, station))
-                TBE_Queue.remove((name, station))
-            else:
-                Waiting_Queue.append((name, station))
-                TBE_Queue.remove((name, station))
+    while TBE_Queue:
+        station = TBE_Queue.popleft()
+        if operands_ready(station):
+            if not start_execution(station):
+                station.state = 'ready'
+                Ready_Queue.append(station)
+        else:
+            station.state = 'waiting'
+            Waiting_Queue.append(station)
         
-    completed = []    
-    for name, station in list(Execute_Queue):
-        station['time'] -= 1
-        print(f"Decremented time for station {name}, remaining time: {station['time']}")
-        if name.startswith('FA'):
-            context.fp_adder_reservation_stations[name]['time'] = station['time']
-        elif name.startswith('FM'):
-            context.fp_mult_reservation_stations[name]['time'] = station['time']
-        elif name.startswith('L'):
-            context.load_buffers[name]['time'] = station['time']
-        elif name.startswith('S'):
-            context.store_buffers[name]['time'] = station['time']
-        elif name.startswith('A'):
-            context.adder_reservation_stations[name]['time'] = station['time']
-        elif name.startswith('M'):
-            context.mult_reservation_stations[name]['time'] = station['time']
+    for _ in range(len(Execute_Queue)):
+        station = Execute_Queue.popleft()
+        station.time -= 1
+        if tracer.execute >= tracer.DEBUG:
+            tracer.emit('execute', f"Decremented time for station {station.name}, remaining time: {station.time}")
         
-        if station['time'] == 0:
-            print(f"Station {name} has completed execution.")
-            completed.append((name, station))
-            
-    for name, station in completed:
-        Result_Queue.append((name, station))
-        Execute_Queue.remove((name, station))
-        print(f"Station {name} moved from Execute to Result Queue")
+        if station.time <= 0:
+            check = lsq.validate_load(station) if station.unit == context.LOAD else None
+            if check == 'hold':
+                station.time = 0
+                Execute_Queue.append(station)
+                continue
+            elif check == 'replay':
+                # A already holds the effective address, so the base is dropped
+                station.Vj = 0
+                station.state = 'waiting'
+                Waiting_Queue.append(station)
+                continue
+            if tracer.execute >= tracer.INFO:
+                tracer.emit('execute', f"Station {station.name} has completed execution.")
+            station.state = 'result'
+            Result_Queue.append(station)
+            if tracer.execute >= tracer.DEBUG:
+                tracer.emit('execute', f"Station {station.name} moved from Execute to Result Queue")
+        else:
+            Execute_Queue.append(station)
 
-    for name, station in list(Waiting_Queue):
-        if station['Qj'] in (0, '0') and station['Qk'] in (0, '0'):
-            Ready_Queue.append((name, station))
-            Waiting_Queue.remove((name, station))
-            print(
-                f"Station {name} is now ready to execute with values "
-                f"Vj={station['Vj']}, Vk={station['Vk']}, "
-                f"Qj={station['Qj']}, Qk={station['Qk']}."
-            )        
-    print('End of Execute Cycle')
-    
-    for name, station in list(Waiting_Queue):
-        if station['Qj'] in (0, '0') and station['Qk'] in (0, '0'):
-            print(f'Station {name} is now ready to execute with values Vj={station["Vj"]}, Vk={station["Vk"]}, Qj={station["Qj"]}, Qk={station["Qk"]}.')
-            Execute_Queue.append((name, station))
-            print(f'Station {name} moved from Waiting to Execute Queue')
-            Waiting_Queue.remove((name, station))
-        
+    for _ in range(len(Waiting_Queue)):
+        station = Waiting_Queue.popleft()
+        if operands_ready(station):
+            station.state = 'ready'
+            Ready_Queue.append(station)
+            if tracer.execute >= tracer.DEBUG:
+                tracer.emit('execute',
+                    f"Station {station.name} is now ready to execute with values "
+                    f"Vj={station.Vj}, Vk={station.Vk}, "
+                    f"Qj={context.tag_name(station.Qj)}, Qk={context.tag_name(station.Qk)}."
+                )
+        else:
+            Waiting_Queue.append(station)
+    if tracer.execute >= tracer.DEBUG:
+        tracer.emit('execute', 'End of Execute Cycle')
     
 def writeback_cycle():
     if Clear_Queue:
-        for name, station in Clear_Queue:
-            station["busy"] = 0
-            if name.startswith('FA'):
-                context.fp_adder_reservation_stations[name]["busy"] = 0
-            elif name.startswith('FM'):
-                context.fp_mult_reservation_stations[name]["busy"] = 0
-            elif name.startswith('L'):
-                context.load_buffers[name]["busy"] = 0
-            elif name.startswith('S'):
-                context.store_buffers[name]["busy"] = 0
-            elif name.startswith('A'):
-                context.adder_reservation_stations[name]["busy"] = 0
-            elif name.startswith('M'):
-                context.mult_reservation_stations[name]["busy"] = 0
-        
-        print(f'Clearing Clear Queue: {Clear_Queue}')
-        Clear_Queue.clear()
+        if tracer.writeback >= tracer.DEBUG:
+            tracer.emit('writeback', f'Clearing Clear Queue: {format_queue(Clear_Queue)}')
+        while Clear_Queue:
+            fetch.release_station(Clear_Queue.popleft())
     
-    if Result_Queue:
-        name, station = Result_Queue[0]
+    # with speculation only results older than every unresolved branch
+    # may write back
+    index = branch.next_result() if Result_Queue else None
+    if index is not None:
+        station = Result_Queue[index]
+        del Result_Queue[index]
         
-        if name.startswith('S'):
-            fetch.write_to_memory(station, CDB.CDB['value'])
-            print(f"Store buffer {name} has written and is now free.")
-            Clear_Queue.append((name, station))
-            Result_Queue.remove((name, station))
+        if station.unit == context.STORE:
+            address = execute.execute_instruction(station)
+            if context.rob_entries:
+                rob.complete(station, station.Vk, address)
+            else:
+                fetch.write_to_memory(address, station.Vk, station.op)
+                lsq.store_written(station.seq)
+                if tracer.state >= tracer.DEBUG:
+                    memory_writes.append((address, station.op))
+            if tracer.writeback >= tracer.INFO:
+                tracer.emit('writeback', f"Store buffer {station.name} has written and is now free.")
+        elif context.rob_entries:
+            try:
+                result = compute_result(station)
+            except (IndexError, ZeroDivisionError) as error:
+                # raised when the instruction commits, if it is not squashed first
+                rob.complete(station, None, fault=error)
+                if tracer.writeback >= tracer.INFO:
+                    tracer.emit('writeback', f'Station {station.name} faulted: {error}')
+            else:
+                rob.complete(station, result)
+                broadcast(station, result)
+        else:
+            broadcast(station, compute_result(station))
+        station.state = "clear"
+        Clear_Queue.append(station)
 
-        tag = name
-        result = execute.execute_instruction(name, station)
-        print(f'Station {name} produced result: {result}')
-        CDB.Enter_CDB_Queue(tag, result)
-        CDB.write_to_CDB()
-        CDB.listen_to_CDB()
-            
-    for name, station in list(Result_Queue):
-        if name.startswith('FA'):
-            for reg_name, reg in context.floating_point_registers.items():
-                if reg["Qi"] == name:
-                    reg["Value"] = CDB.CDB['value']
-                    reg["Qi"] = "0"
-            print(f"Reservation station {name} has written back and is now free.")
-            Clear_Queue.append((name, station))
-            Result_Queue.remove((name, station))
-        elif name.startswith('FM'):
-            for reg_name, reg in context.floating_point_registers.items():
-                if reg["Qi"] == name:
-                    reg["Value"] = CDB.CDB['value']
-                    reg["Qi"] = "0"
-            print(f"Reservation station {name} has written back and is now free.")
-            Clear_Queue.append((name, station))
-            print(f"Reservation station {name} has written to Clear Queue.")
-            Result_Queue.remove((name, station))
-        elif name.startswith('L'):
-            for reg_name, reg in context.floating_point_registers.items():
-                if reg["Qi"] == name:
-                    reg["Value"] = CDB.CDB['value']
-                    reg["Qi"] = "0"
-            print(f"Load buffer {name} has written back and is now free.")
-            Clear_Queue.append((name, station))
-            Result_Queue.remove((name, station))
-        elif name.startswith('A') or name.startswith('M'):
-            for reg_name, reg in context.general_registers.items():
-                if reg["Qi"] == name:
-                    reg["Value"] = CDB.CDB['value']
-                    reg["Qi"] = "0"
-            for reg_name, reg in context.floating_point_registers.items():
-                if reg["Qi"] == name:
-                    reg["Value"] = CDB.CDB['value']
-                    reg["Qi"] = "0"
-            print(f"Reservation station {name} has written back and is now free.")
-            Clear_Queue.append((name, station))
-            Result_Queue.remove((name, station))
\ No newline at end of file
+def compute_result(station):
+    if station.unit == context.LOAD:
+        return lsq.load_result(station)
+    return execute.execute_instruction(station)
+
+def broadcast(station, result):
+    if tracer.writeback >= tracer.INFO:
+        tracer.emit('writeback', f'Station {station.name} produced result: {result}')
+    CDB.Enter_CDB_Queue(station.dest, result)
+    CDB.write_to_CDB()
+    CDB.listen_to_CDB()
+    if tracer.writeback >= tracer.DEBUG:
+        tracer.emit('writeback', f"Reservation station {station.name} has written back and is now free.")
+
+def commit_cycle():
+    # retire finished instructions from the head of the reorder buffer in
+    # program order, at most commit_width per cycle
+    if not rob.count:
+        return
+    for _ in range(context.commit_width):
+        entry = rob.head_entry()
+        if entry is None or not entry.ready:
+            return
+        if entry.fault is not None:
+            raise entry.fault
+        if fetch.unit_for_opcode(entry.op) == context.STORE:
+            fetch.write_to_memory(entry.address, entry.value, entry.op)
+            lsq.store_written(entry.seq)
+            if tracer.state >= tracer.DEBUG:
+                memory_writes.append((entry.address, entry.op))
+        elif entry.dest is not None:
+            register = context.registers[entry.dest]
+            register.Value = entry.value
+            if register.Qi == entry.id:
+                register.Qi = 0
+        rob.retire()
+        if tracer.commit >= tracer.INFO:
+            tracer.emit('commit', f"Committed {entry.name}")
+
+def idle_cycles():
+    # Cycles from now in which only execution countdowns change: nothing can
+    # issue, reach the CDB, wake up or be cleared until the first executing
+    # station completes. Waiting stations need a broadcast to become ready,
+    # and a held instruction needs a station to be cleared. The cache's
+    # MSHR fills and write buffer drains also end an idle stretch.
+    if TBE_Queue or Ready_Queue or Result_Queue or Clear_Queue or CDB.CDB_Queue:
+        return 0
+    entry = rob.head_entry()
+    if entry is not None and entry.ready:
+        return 0
+    instruction = fetch.get_current_instruction()
+    if instruction is not None and issue_stall(instruction) is None:
+        return 0
+    idle = min(station.time for station in Execute_Queue) - 1 if Execute_Queue else None
+    if context.mshr_entries or context.write_buffer_entries:
+        event = cache.next_event()
+        if event is not None:
+            wait = event - context.clock_cycle - 1
+            idle = wait if idle is None else min(idle, wait)
+    return idle or 0
+
+def idle_cycles_traced():
+    # idle cycles still print these messages, so they cannot be skipped
+    return (tracer.cycle >= tracer.INFO or tracer.issue >= tracer.INFO
+            or tracer.execute >= tracer.DEBUG or tracer.state >= tracer.DEBUG)
+
+def skip_cycles(count):
+    context.clock_cycle += count
+    for station in Execute_Queue:
+        station.time -= count
+    if context.mshr_entries or context.write_buffer_entries:
+        cache.skip(count)
+    # the stall counters advance as fetch_cycle would have advanced them
+    if context.STALL:
+        context.branch_stall_cycles += count
+        return
+    instruction = fetch.get_current_instruction()
+    if instruction is None:
+        return
+    if issue_stall(instruction) == 'rob':
+        rob.full_stall_cycles += count
+    else:
+        context.structural_stall_cycles += count
@@ -1,126 +1,89 @@
+import branch
 import context
 import fetch
+import opcodes
+import tracer
 
             
-def execute_instruction(name, station):
-    address = 0
-    if name[0] == 'F':
-        if (name[1] == 'A') or (name[1] == 'M'):
-            print (f"Executing FP instruction at station {name}")
-            if (station['Qj'] in (0, '0')):
-                res_1 = station['Vj']
-            else: 
-                res_1 = station['Qj']
-            if (station['Qk'] in (0, '0')):
-                res_2 = station['Vk']
-            else:
-                res_2 = station['Qk']
-            result = execute_fp_arithmatic(station['op'], res_1, res_2)
-            print(f"Executed FP instruction at station {name}, result: {result}")
-            return result
-    elif name[0] == 'L':
-        print (f'Executing Load instruction at station {name}')
-        if station['Qj'] in (0, '0'):
-            res_1 = station['Vj']
-        else: 
-            res_1 = station['Qj']
-            
-        address = int(res_1) + int(station['A'])
-        result = fetch.get_from_memory(address)
-        return result
-    elif name[0] == 'S':
-        print (f'Executing Store instruction at station {name}')
-        if station['Qj'] in (0, '0'):
-            res_1 = station['Vj']
-        else: 
-            res_1 = station['Qj']
-            
-        address = int(res_1) + int(station['A'])
-        print(address)
-        return address
-    elif station['op'] in (26, 27):
-        print (f"Executing Loop instruction at station {name}")
-        if (station['Qj'] in (0, '0')):
-            res_1 = station['Vj']
-        else: 
-            res_1 = station['Qj']
-        if (station['Qk'] in (0, '0')):
-            res_2 = station['Vk']
-        else:
-            res_2 = station['Qk']
-        handle_loop_instruction(station['op'], res_1,  res_2, station['A'])
+def execute_instruction(station):
+    return executors[station.op](station)
+
+def execute_fp(station):
+    name = station.name
+    if tracer.execute >= tracer.DEBUG:
+        tracer.emit('execute', f"Executing FP instruction at station {name}")
+    result = execute_fp_arithmatic(station.op, station.Vj, station.Vk)
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Executed FP instruction at station {name}, result: {result}")
+    return result
+
+def execute_load(station):
+    if tracer.execute >= tracer.DEBUG:
+        tracer.emit('execute', f'Executing Load instruction at station {station.name}')
+    # A holds the effective address once the access has started
+    return fetch.get_from_memory(station.A, station.op)
+
+def execute_store(station):
+    if tracer.execute >= tracer.DEBUG:
+        tracer.emit('execute', f'Executing Store instruction at station {station.name}')
+        tracer.emit('execute', f"Store address: {station.A}")
+    return station.A
+
+def execute_branch(station):
+    if tracer.execute >= tracer.DEBUG:
+        tracer.emit('execute', f"Executing Loop instruction at station {station.name}")
+    if branch.predictor is not None:
+        branch.resolve(station, compute_if_loop(station.Vj, station.Vk, station.op))
     else:
-        print (f"Executing Integer instruction at station {name}")
-        if (station['Qj'] in (0, '0')):
-            res_1 = station['Vj']
-        else: 
-            res_1 = station['Qj']
-        if (station['Qk'] in (0, '0')):
-            res_2 = station['Vk']
-        else:
-            res_2 = station['Qk']
-        result = execute_integer_arithmatic(station['op'], res_1, res_2, station['A'])
-        print(f"Executed Integer instruction at station {name}, result: {result}")
-        return result
-    
+        handle_loop_instruction(station.op, station.Vj, station.Vk, station.A)
+
+def execute_integer(station):
+    name = station.name
+    if tracer.execute >= tracer.DEBUG:
+        tracer.emit('execute', f"Executing Integer instruction at station {name}")
+    result = execute_integer_arithmatic(station.op, station.Vj, station.Vk, station.A)
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Executed Integer instruction at station {name}, result: {result}")
+    return result
+
 def execute_fp_arithmatic(op, rs, rt):
-    if op == 15:  # ADD.D
-        return int(rs) + int(rt)
-    elif op == 16:  # ADD.S
-        return int(rs) + int(rt)
-    elif op == 17:  # SUB.D
-        return int(rs) - int(rt)
-    elif op == 18:  # SUB.S
-        return int(rs) - int(rt)
-    elif op == 19:  # MUL.D
-        return int(rs) * int(rt)
-    elif op == 20:  # MUL.S
-        return int(rs) * int(rt)
-    elif op == 21:  # DIV.D
-        return int(rs) / int(rt)
-    elif op == 22:  # DIV.S
-        return int(rs) / int(rt)
-    
+    return opcodes.TABLE[op].operation(float(rs), float(rt))
+
 def execute_integer_arithmatic(op, rs, rt, immediate):
-    if op == 9:  # ADD
-        return int(rs) + int(rt)
-    elif op == 10:  # DADDI
-        return int(rs) + int(immediate)
-    elif op == 11:  # SUB
-        return int(rs) - int(rt)
-    elif op == 12:  # DSUBI
-        return int(rs) - int(immediate)
-    elif op == 13:  # MUL
-        return int(rs) * int(rt)
-    elif op == 14:  # DIV
-        return int(rs) / int(rt)
+    row = opcodes.TABLE[op]
+    if row.shape == opcodes.IMMEDIATE:  # DADDI, DSUBI
+        return row.operation(int(rs), int(immediate))
+    return row.operation(int(rs), int(rt))
     
     
-def handle_loop_instruction(opcode, rs_value, rt_value, name):
-    new_pc = None
-    new_pc = compute_loopback_address(name)
+def handle_loop_instruction(opcode, rs_value, rt_value, target):
+    new_pc = target
     do_loop = compute_if_loop(rs_value, rt_value, opcode)
     if do_loop is True:
         context.pc = new_pc
-        print(f"Loop taken. New PC: {context.pc}")
+        if tracer.execute >= tracer.INFO:
+            tracer.emit('execute', f"Loop taken. New PC: {context.pc}")
         context.unstall_pipeline()
         return None
     else:
-        print("Loop not taken.")
+        if tracer.execute >= tracer.INFO:
+            tracer.emit('execute', "Loop not taken.")
         context.increment_pc(1)
         context.unstall_pipeline()
         return 0
 
 def compute_if_loop(rs_value, rt_value, opcode):
-    if opcode == 26:  # BEQ
-        return rs_value == rt_value
-    elif opcode == 27:  # BNE
-        return rs_value != rt_value
-    return False
+    return opcodes.TABLE[opcode].operation(rs_value, rt_value)
 
-def compute_loopback_address(label):
-    if label in fetch.labels:
-        return fetch.labels[label]
-    else:
-        print(f"Error: Label '{label}' not found.")
-        return 0
\ No newline at end of file
+# the execute handler of every opcode, found with one index by station.op;
+# swapping execute_fp_arithmatic and friends (see batch.py) still takes
+# effect because the handlers call them through the module
+UNIT_EXECUTORS = {
+    opcodes.ADDER: execute_integer,
+    opcodes.FP_ADDER: execute_fp,
+    opcodes.FP_MULT: execute_fp,
+    opcodes.LOAD: execute_load,
+    opcodes.STORE: execute_store,
+}
+executors = [execute_branch if row.shape == opcodes.BRANCH else UNIT_EXECUTORS.get(row.unit)
+             for row in opcodes.TABLE]
@@ -1,437 +1,392 @@
+from collections import namedtuple
+
+import branch
 import context
+import CDB
+import opcodes
+import rob
+import tracer
 
 labels = {}
 
+Instruction = namedtuple('Instruction', ('text', 'opcode', 'rs', 'rt', 'rd', 'immediate', 'name', 'target'))
+
 def get_current_instruction():
     pc = context.pc
-    if pc < len(context.instruction_memory) and context.STALL == False:
-        instruction = context.instruction_memory[pc]
+    if pc < len(context.decoded_program) and context.STALL == False:
+        instruction = context.decoded_program[pc]
         return instruction
     return None
 
 def pull_value_from_register(register):
-    if not register:
+    if register is None:
         return 0
-    register = register.strip()
-    if register.startswith('F'):
-        return context.floating_point_registers[register]["Value"]
-    return context.general_registers[register]["Value"]
+    return context.registers[register].Value
     
 def pull_qi_from_register(register):
-    if not register:
+    if register is None:
         return 0
-    register = register.strip()
-    if register.startswith('F'):
-        return context.floating_point_registers[register]["Qi"]
-    return context.general_registers[register]["Qi"]
+    return context.registers[register].Qi
+
+def read_source(register):
+    qi = pull_qi_from_register(register)
+    if qi == 0:
+        return pull_value_from_register(register), 0
+    entry = rob.ready_entry(qi)
+    if entry is not None:
+        return entry.value, 0
+    return '-', qi
     
 def set_in_register(register, tag, value):
-    if not register:
+    if register is None:
         return
-    register = register.strip()
+    if isinstance(register, str):
+        register = context.register_ids[register.strip()]
+    entry = context.registers[register]
 
     if tag == 0:
-        if register.startswith('F'):
-            context.floating_point_registers[register]["Value"] = value
-        else:
-            context.general_registers[register]["Value"] = value
+        entry.Value = value
     else:
-        if register.startswith('F'):
-            context.floating_point_registers[register]["Qi"] = value
-        else:
-            context.general_registers[register]["Qi"] = value
+        if isinstance(value, str):
+            value = context.station_ids[value]
+        entry.Qi = value
+        # with a reorder buffer the register is written at commit instead
+        if not rob.is_tag(value):
+            CDB.add_consumer(value, entry, 'i')
+
+def register_name(register):
+    if register is None:
+        return None
+    return context.registers[register].name
 
 
-def get_from_memory(address):
-    return address
+def get_from_memory(address, opcode):
+    layout = context.memory_formats[opcode]
+    if address < 0 or address + layout.size > len(context.data_memory):
+        raise IndexError(f"Load of {layout.size} bytes at address {address} is outside data memory")
+    return layout.unpack_from(context.data_memory, address)[0]
 
-def write_to_memory(address, value):
-    return
+def write_to_memory(address, value, opcode):
+    layout = context.memory_formats[opcode]
+    if address < 0 or address + layout.size > len(context.data_memory):
+        raise IndexError(f"Store of {layout.size} bytes at address {address} is outside data memory")
+    if layout.format[-1] in 'fd':
+        value = float(value)
+    else:
+        value = int(value)
+    layout.pack_into(context.data_memory, address, value)
+    if tracer.memory >= tracer.INFO:
+        tracer.emit('memory', f"Stored {value} at address {address}")
     
-def decode_instruction(instruction):
+def operand(operands, index):
+    if len(operands) > index:
+        return operands[index].strip(',')
+    return None
+
+def decode_memory(operands):
+    # rd, offset(rs) or rd, address
     rs = None
-    rt = None
-    rd = None
     immediate = None
-    address = None
-    name = ""
-    
-    val_rs = 0
-    val_rt = 0
-    
+    if len(operands) >= 2:
+        offset_part = operands[1]
+        if '(' in offset_part and ')' in offset_part:
+            offset, rs_part = offset_part.split('(')
+            rs = rs_part.strip(')')
+            immediate = int(offset.strip() or 0)
+        else:
+            immediate = int(offset_part.strip())
+    return rs, None, operand(operands, 0), immediate, ""
+
+def decode_immediate(operands):
+    # rd, rs, #immediate
+    immediate = None
+    if len(operands) >= 3:
+        immediate = int(operands[2].strip(',').strip('#'))
+    return operand(operands, 1), None, operand(operands, 0), immediate, ""
+
+def decode_registers(operands):
+    # rd, rs, rt
+    return operand(operands, 1), operand(operands, 2), operand(operands, 0), None, ""
+
+def decode_jump(operands):
+    return None, None, None, None, operand(operands, 0) or ""
+
+def decode_jump_register(operands):
+    return operand(operands, 0), None, None, None, ""
+
+def decode_branch(operands):
+    # rs, rt, label
+    return operand(operands, 0), operand(operands, 1), None, None, operand(operands, 2) or ""
+
+def decode_none(operands):
+    return None, None, None, None, ""
+
+# operand parser for each opcodes shape; each returns (rs, rt, rd, immediate, label)
+SHAPE_DECODERS = {
+    opcodes.NONE: decode_none,
+    opcodes.MEMORY: decode_memory,
+    opcodes.IMMEDIATE: decode_immediate,
+    opcodes.REGISTER: decode_registers,
+    opcodes.JUMP: decode_jump,
+    opcodes.JUMP_REGISTER: decode_jump_register,
+    opcodes.BRANCH: decode_branch,
+}
+
+def decode_instruction(instruction):
     parts = instruction.split()
-    if (parts[0].endswith(':')):
-        label = parts[0][:-1]
-        labels[label] = context.pc
+    if parts and parts[0].endswith(':'):
         parts = parts[1:]
-        
-    print(f"Labels: {labels}")
+    if not parts:
+        return Instruction(instruction, context.isa['NOP'], None, None, None, None, "", None)
 
     opcode = context.isa.get(parts[0], -1)
-    operands = parts[1:] if len(parts) > 1 else []
+    row = opcodes.lookup(opcode)
+    if row is None:
+        if tracer.setup >= tracer.WARN:
+            tracer.emit('setup', f"Warning: Unknown instruction '{instruction}'")
+        rs = rt = rd = immediate = None
+        name = ""
+    else:
+        rs, rt, rd, immediate, name = SHAPE_DECODERS[row.shape](parts[1:])
 
-    if (opcode == -1):
-        print(f"Warning: Unknown instruction '{instruction}'")
-        
-    elif (opcode < 9):
-        print(f"Decoding Load/Store instruction: {instruction}")
-        if len(operands) >= 1:
-            rd = operands[0].strip(',')
-        if len(operands) >= 2:
-            offset_part = operands[1]
-            if '(' in offset_part and ')' in offset_part:
-                offset, rs_part = offset_part.split('(')
-                rs = rs_part.strip(')')
-                immediate = offset.strip()
-                rs_val = pull_value_from_register(rs)
-                address = str(int(immediate) + int(rs_val))
-            else:
-                immediate = offset_part.strip()
-                
-        if (5 <= opcode):
-            temp = rs
-            rs = rd
-            rd = temp 
-            
-        val_rs = pull_value_from_register(rs)
-        val_rt = pull_value_from_register(rt)
-        
-    elif (9 <= opcode <= 14):
-        print(f"Decoding Integer Arithmetic instruction: {instruction}")
-
-        if opcode in (10, 12):
-            if len(operands) >= 1:
-                rd = operands[0].strip(',')
-            if len(operands) >= 2:
-                rs = operands[1].strip(',')
-            if len(operands) >= 3:
-                immediate = operands[2].strip(',').strip('#')
-            
-            val_rs = pull_value_from_register(rs)
-            
+    target = None
+    if name:
+        if name in labels:
+            target = labels[name]
         else:
-            if len(operands) >= 1:
-                rd = operands[0].strip(',')
-            if len(operands) >= 2:
-                rs = operands[1].strip(',')
-            if len(operands) >= 3:
-                rt = operands[2].strip(',')
-                
-            val_rs = pull_value_from_register(rs)
-            val_rt = pull_value_from_register(rt)
-        
-            
-    elif (15 <= opcode <= 22):
-        print(f"Decoding Floating-Point Arithmetic instruction: {instruction}")
-        
-        if len(operands) >= 1:
-            rd = operands[0].strip(',')
-        if len(operands) >= 2:
-            rs = operands[1].strip(',')
-        if len(operands) >= 3:
-            rt = operands[2].strip(',')
-            
-        val_rs = pull_value_from_register(rs)
-        val_rt = pull_value_from_register(rt)
-            
-    elif (23 <= opcode <= 27):
-        print(f"Decoding Control instruction: {instruction}")
-        
-        if (opcode == 23):  #J
-            if len(operands) >= 1:
-                name = operands[0].strip(',')
-        elif (opcode == 24):  #JR
-            if len(operands) >= 1:
-                rs = operands[0].strip(',')
-        elif (opcode == 25):  #JAL
-            if len(operands) >= 1:
-                name = operands[0].strip(',')
-        elif ((opcode == 26) or (opcode == 27)):  #BEQ or BNE
-            if len(operands) >= 1:
-                rs = operands[0].strip(',')
-            if len(operands) >= 2:
-                rt = operands[1].strip(',')
-            if len(operands) >= 3:
-                name = operands[2].strip(',')
-                
-        val_rs = pull_value_from_register(rs)
-        val_rt = pull_value_from_register(rt)       
+            if tracer.setup >= tracer.WARN:
+                tracer.emit('setup', f"Error: Label '{name}' not found.")
+            target = 0
     
-    testpayload = [opcode, operands, rs, rt, rd, immediate, address, name, val_rs, val_rt]
-    payload = [opcode, rs, rt, rd, immediate, address, name]
-    opcode = operands = rs = rt = rd = immediate = address = name = val_rs = val_rt = 0
-    
-    return payload
-
-def write_to_reservation_station(payload):
-    opcode = payload[0]
-    rs = payload[1]
-    rt = payload[2]
-    rd = payload[3]
-    immediate = payload[4]
-    address = payload[5]
-    name = payload[6]
+    return Instruction(instruction, opcode, decode_register(rs, instruction), decode_register(rt, instruction),
+                       decode_register(rd, instruction), immediate, name, target)
+
+def decode_register(register, instruction):
+    if not register:
+        return None
+    register_id = context.register_ids.get(register)
+    if register_id is None and tracer.setup >= tracer.WARN:
+        tracer.emit('setup', f"Warning: Unknown register '{register}' in '{instruction}'")
+    return register_id
+
+def decode_program(instructions):
+    labels.clear()
+    for pc, instruction in enumerate(instructions):
+        parts = instruction.split()
+        if parts and parts[0].endswith(':'):
+            labels[parts[0][:-1]] = pc
+    if tracer.setup >= tracer.INFO:
+        tracer.emit('setup', f"Labels: {labels}")
+
+    return [decode_instruction(instruction) for instruction in instructions]
+
+def write_to_reservation_station(instruction):
+    opcode = instruction.opcode
+    rs = instruction.rs
+    rt = instruction.rt
+    rd = instruction.rd
+    immediate = instruction.immediate
     
-    print(f"Writing to reservation station with payload: {payload}")
-    print({"opcode": opcode, "rs": rs, "rt": rt, "rd": rd, "immediate": immediate, "address": address})
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', f"Writing to reservation station: {instruction.text}")
+        tracer.emit('issue', str({"opcode": opcode, "rs": register_name(rs), "rt": register_name(rt),
+                                  "rd": register_name(rd), "immediate": immediate, "target": instruction.target}))
     
-    if opcode in range(0, 9):
-        print("Writing to Load/Store Buffer")
-        return write_to_ls_st_buffer(opcode, rd, rs, immediate, address)
-    elif opcode in range(9, 15):
-        print("Writing to Integer Arithmetic Reservation Station")
-        return write_to_integer_reservation_station(opcode, rd, rs, rt, immediate)
-    elif opcode in range(15, 23):
-        print("Writing to Floating-Point Arithmetic Reservation Station")
-        return write_to_fp_reservation_station(opcode, rd, rs, rt)
-    elif opcode in range(23, 28):
-        print("Handling Control Instruction")
-        write_control_instruction(opcode, rs, rt, immediate, name)
+    if opcodes.lookup(opcode) is None:
+        if tracer.issue >= tracer.WARN:
+            tracer.emit('issue', "Unknown opcode; cannot write to reservation station")
+        return None
+    return issuers[opcode](instruction)
+
+def issue_nop(instruction):
+    if tracer.issue >= tracer.INFO:
+        tracer.emit('issue', "NOP; nothing to issue")
+    return None
+
+def issue_memory(instruction):
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', "Writing to Load/Store Buffer")
+    return write_to_ls_st_buffer(instruction.opcode, instruction.rd, instruction.rs, instruction.immediate)
+
+def issue_integer(instruction):
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', "Writing to Integer Arithmetic Reservation Station")
+    return write_to_integer_reservation_station(instruction.opcode, instruction.rd, instruction.rs, instruction.rt,
+                                                instruction.immediate)
+
+def issue_fp(instruction):
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', "Writing to Floating-Point Arithmetic Reservation Station")
+    return write_to_fp_reservation_station(instruction.opcode, instruction.rd, instruction.rs, instruction.rt)
+
+def issue_control(instruction):
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', "Handling Control Instruction")
+    issued = write_control_instruction(instruction.opcode, instruction.rs, instruction.rt, instruction.target,
+                                       instruction.name)
+    if issued is None or branch.predictor is None:
         context.stall_pipeline()
-        return 0
-    else:
-        print("Unknown opcode; cannot write to reservation station")
+    return issued
+
+SHAPE_ISSUERS = {
+    opcodes.NONE: issue_nop,
+    opcodes.MEMORY: issue_memory,
+    opcodes.IMMEDIATE: issue_integer,
+    opcodes.JUMP: issue_control,
+    opcodes.JUMP_REGISTER: issue_control,
+    opcodes.BRANCH: issue_control,
+}
+
+def issuer_for(row):
+    if row.shape == opcodes.REGISTER:
+        return issue_fp if row.unit in (opcodes.FP_ADDER, opcodes.FP_MULT) else issue_integer
+    return SHAPE_ISSUERS[row.shape]
+
+# the issue handler of every opcode, found with one index
+issuers = [issuer_for(row) for row in opcodes.TABLE]
+
+# checked every cycle an instruction waits to issue, so kept as a plain dict
+opcode_units = {row.opcode: row.unit for row in opcodes.TABLE}
+branch_opcodes = frozenset(row.opcode for row in opcodes.TABLE if row.shape == opcodes.BRANCH)
+
+def unit_for_opcode(opcode):
+    return opcode_units.get(opcode)
+
+def station_available(opcode):
+    unit = unit_for_opcode(opcode)
+    return unit is None or context.free_masks[unit] != 0
+
+def allocate_station(unit):
+    mask = context.free_masks[unit]
+    if mask == 0:
         return None
+    lowest = mask & -mask
+    context.free_masks[unit] = mask ^ lowest
+    station = context.unit_stations[unit][lowest.bit_length() - 1]
+    station.dest = rob.allocate() if context.rob_entries else station.id
+    return station
+
+def release_station(station):
+    station.busy = 0
+    station.state = "free"
+    context.free_masks[station.unit] |= 1 << station.slot
         
-def write_to_ls_st_buffer(opcode, rd, rs, immediate, address):
-    buffer_name = None
-    flag = ""
-    
-    if (1 <= opcode <= 4):  # L
-        i = 1
-        flag = "L"
-        while f"L{i}" in context.load_buffers:
-            if context.load_buffers[f"L{i}"]["busy"] == 0:
-                buffer_name = f"L{i}"
-                break
-            i += 1
-    elif (5 <= opcode <= 8):  # S
-        i = 1
-        flag = "S"
-        while f"S{i}" in context.store_buffers:
-            if context.store_buffers[f"S{i}"]["busy"] == 0:
-                buffer_name = f"S{i}"
-                break
-            i += 1
-            
-    if buffer_name is None:
-        print("No free Load/Store buffer available")
-        context.stall_pipeline()
+def write_to_ls_st_buffer(opcode, rd, rs, immediate):
+    row = opcodes.TABLE[opcode]
+    buffer = allocate_station(row.unit)
+    if buffer is None:
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', "No free Load/Store buffer available")
         return None
-    context.unstall_pipeline()
     
-    if (pull_qi_from_register(rs) in (0, '0')):
-        vj = pull_value_from_register(rs)
-        qj = 0
+    # Vj/Qj hold the base register; for stores Vk/Qk hold the data register
+    buffer.Vj, buffer.Qj = read_source(rs)
+    if buffer.Qj:
+        CDB.add_consumer(buffer.Qj, buffer, 'j')
+        
+    if (buffer.unit == context.STORE):
+        buffer.Vk, buffer.Qk = read_source(rd)
+        if buffer.Qk:
+            CDB.add_consumer(buffer.Qk, buffer, 'k')
     else:
-        vj = '-'
-        qj = pull_qi_from_register(rs)
-
-    if (rd is not None):
-        set_in_register(rd, 1, buffer_name)     
+        buffer.Qk = 0
+        if (rd is not None):
+            set_in_register(rd, 1, buffer.dest)
         
-    if (flag == "L"):
-        buffers = context.load_buffers
-        buffers[buffer_name]["time"] = context.load_latency
-        buffers[buffer_name]["op"] = opcode
-        buffers[buffer_name]['busy'] = 1
-        if qj == 0:
-            buffers[buffer_name]["Vj"] = vj
-            buffers[buffer_name]["Qj"] = 0
-            buffers[buffer_name]["A"] = address
-        else:
-            buffers[buffer_name]["Vj"] = '-'
-            buffers[buffer_name]["Qj"] = qj
-            buffers[buffer_name]["A"] = immediate
-    elif (flag == "S"):
-        buffers = context.store_buffers
-        buffers[buffer_name]["time"] = context.store_latency
-        buffers[buffer_name]["op"] = opcode
-        buffers[buffer_name]['busy'] = 1
-        if qj == 0:
-            buffers[buffer_name]["Vj"] = vj
-            buffers[buffer_name]["Qj"] = 0
-            buffers[buffer_name]["A"] = address
-        else:
-            buffers[buffer_name]["Vj"] = '-'
-            buffers[buffer_name]["Qj"] = qj
-            buffers[buffer_name]["A"] = immediate
-            
-    print(f"Issued Load/Store instruction to buffer {buffer_name}: {rd}, {rs}, {immediate}, {address}")
-    return 0
+    # the cache sets the access time when the access starts (see cycles.start_execution)
+    buffer.time = 0
+    buffer.op = opcode
+    buffer.busy = 1
+    buffer.A = immediate
+    buffer.state = "issued"
+    if tracer.issue >= tracer.INFO:
+        tracer.emit('issue', f"Issued Load/Store instruction to buffer {buffer.name}: "
+                             f"{register_name(rd)}, {immediate}({register_name(rs)})")
+    return buffer
         
 def write_to_integer_reservation_station(opcode, rd, rs, rt, immediate):
-    if opcode in (10, 12):  # DADDI, DSUBI
-        stations = context.adder_reservation_stations
-        prefix = "A"
-    else:
+    row = opcodes.TABLE[opcode]
+    if row.unit is None:  # ADD, SUB, MUL and DIV are not issued
         return None
-    
-    station_name = None
-    i = 1
-    while f"{prefix}{i}" in stations:
-        if stations[f"{prefix}{i}"]["busy"] == 0:
-            station_name = f"{prefix}{i}"
-            break
-        i += 1
-    
-    if station_name is None:
-        print("No free Integer reservation station available")
-        context.stall_pipeline()
+    station = allocate_station(row.unit)
+    if station is None:
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', "No free Integer reservation station available")
         return None
-    context.unstall_pipeline()
 
-    if (pull_qi_from_register(rs) in (0, '0')):
-        vj = pull_value_from_register(rs)
-        qj = 0
-    else:
-        vj = '-'
-        qj = pull_qi_from_register(rs)
+    station.Vj, station.Qj = read_source(rs)
+    if station.Qj:
+        CDB.add_consumer(station.Qj, station, 'j')
+    station.Vk = 0
+    station.Qk = 0
     if (rd is not None):
-        set_in_register(rd, 1, station_name)
-    
-    if (opcode in (10, 12)):  # DADDI, DSUBI
-        stations[station_name]["time"] = context.add_latency
-        
-    stations[station_name]["busy"] = 1
-    stations[station_name]["op"] = opcode
-    stations[station_name]["A"] = immediate
+        set_in_register(rd, 1, station.dest)
     
-    if qj == 0:
-        stations[station_name]["Vj"] = vj
-        stations[station_name]["Qj"] = 0
-    else:
-        stations[station_name]["Vj"] = '-'
-        stations[station_name]["Qj"] = qj
-        
-
-        
-    print(f"Issued Integer instruction to station {station_name}: {rd}, {rs}, {immediate}")
-    return 0
+    station.time = getattr(context, row.latency)
+    station.busy = 1
+    station.op = opcode
+    station.A = immediate
+    station.state = "issued"
+    if tracer.issue >= tracer.INFO:
+        tracer.emit('issue', f"Issued Integer instruction to station {station.name}: "
+                             f"{register_name(rd)}, {register_name(rs)}, {immediate}")
+    return station
    
    
 def write_to_fp_reservation_station(opcode, rd, rs, rt):
-    
-    if opcode in range(15, 19):   # ADD.D, ADD.S, SUB.D, SUB.S
-        stations = context.fp_adder_reservation_stations
-        prefix = "FA"
-    elif opcode in range(19, 23): # MUL.D, MUL.S, DIV.D, DIV.S
-        stations = context.fp_mult_reservation_stations
-        prefix = "FM"
-    else:
-        return None
-    
-    station_name = None
-    i = 1
-    while f"{prefix}{i}" in stations:
-        if stations[f"{prefix}{i}"]["busy"] == 0:
-            station_name = f"{prefix}{i}"
-            break
-        i += 1
-
-    if station_name is None:
-        print("No free FP reservation station available")
-        context.stall_pipeline()
+    row = opcodes.TABLE[opcode]
+    station = allocate_station(row.unit)
+    if station is None:
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', "No free FP reservation station available")
         return None
-    context.unstall_pipeline()
-
-    if (pull_qi_from_register(rs) in (0, '0')):
-        vj = pull_value_from_register(rs)
-        qj = 0
-    else:
-        vj = '-'
-        qj = pull_qi_from_register(rs)
 
-    if (pull_qi_from_register(rt) in (0, '0')):
-        vk = pull_value_from_register(rt)
-        qk = 0
-    else:
-        vk = '-'
-        qk = pull_qi_from_register(rt)
+    station.Vj, station.Qj = read_source(rs)
+    if station.Qj:
+        CDB.add_consumer(station.Qj, station, 'j')
+    station.Vk, station.Qk = read_source(rt)
+    if station.Qk:
+        CDB.add_consumer(station.Qk, station, 'k')
     if (rd is not None):
-        set_in_register(rd, 1, station_name)
-    
-
-    if (opcode in (15, 16, 17, 18)):  # ADD.D, ADD.S, SUB.D, SUB.S
-        stations[station_name]["time"] = context.fp_add_latency
-    elif (opcode in (19, 20)):  # MUL.D, MUL.S, DIV.D, DIV.S
-        stations[station_name]["time"] = context.fp_mult_latency
-    elif (opcode in (21, 22)):
-        stations[station_name]["time"] = context.fp_div_latency
-    
-    stations[station_name]["busy"] = 1
-    stations[station_name]["op"] = opcode
-    stations[station_name]["A"] = ""
+        set_in_register(rd, 1, station.dest)
 
-    if qj == 0:
-        stations[station_name]["Vj"] = vj
-        stations[station_name]["Qj"] = 0
-    else:
-        stations[station_name]["Vj"] = '-'
-        stations[station_name]["Qj"] = qj
+    station.time = getattr(context, row.latency)
+    station.busy = 1
+    station.op = opcode
+    station.A = ""
+    station.state = "issued"
+    if tracer.issue >= tracer.INFO:
+        tracer.emit('issue', f"Issued FP instruction to station {station.name}: "
+                             f"{register_name(rd)}, {register_name(rs)}, {register_name(rt)}")
+    return station
 
-    if qk == 0:
-        stations[station_name]["Vk"] = vk
-        stations[station_name]["Qk"] = 0
-    else:
-        stations[station_name]["Vk"] = '-'
-        stations[station_name]["Qk"] = qk
-
-    print(f"Issued FP instruction to station {station_name}: {rd}, {rs}, {rt}")
-    return 0
-
-def write_control_instruction(op, rs, rt, immediate, name):
-    print(f"Writing control instruction: op={op}, rs={rs}, rt={rt}, immediate={immediate}, name={name}")
-    prefix = ''
-    stations = {}
-    if (op in (26, 27)): #BEQ OR BNE
-        stations = context.adder_reservation_stations
-        prefix = 'A'
+def write_control_instruction(op, rs, rt, target, name):
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', f"Writing control instruction: op={op}, rs={register_name(rs)}, "
+                             f"rt={register_name(rt)}, target={target}, name={name}")
+    row = opcodes.TABLE[op]
+    station = None
+    if row.unit is not None:  # BEQ, BNE
+        station = allocate_station(row.unit)
     
-    station_name = None
-    i = 1
-    while f"{prefix}{i}" in stations:
-        if stations[f"{prefix}{i}"]["busy"] == 0:
-            station_name = f"{prefix}{i}"
-            break
-        i += 1
-        
-    if station_name is None:
-        print("No free adder reservation station available for control instruction")
+    if station is None:
+        if tracer.issue >= tracer.INFO:
+            tracer.emit('issue', "No free adder reservation station available for control instruction")
         return None
     
-    if (pull_qi_from_register(rs) in (0, '0')):
-        vj = pull_value_from_register(rs)
-        qj = 0
-    else:
-        vj = '-'
-        qj = pull_qi_from_register(rs)
-    
-    if (pull_qi_from_register(rt) in (0, '0')):
-        vk = pull_value_from_register(rt)
-        qk = 0
-    else:
-        vk = '-'
-        qk = pull_qi_from_register(rt)
-        
-    stations[station_name]["busy"] = 1
-    stations[station_name]["op"] = op
-    stations[station_name]["A"] = name
-        
-    stations[station_name]["time"] = 1
-    
-    if (pull_qi_from_register(rs) in (0, '0')):
-        stations[station_name]["Vj"] = vj
-        stations[station_name]["Qj"] = 0
-    else:
-        stations[station_name]["Vj"] = '-'
-        stations[station_name]["Qj"] = qj
-    if (pull_qi_from_register(rt) in (0, '0')):
-        stations[station_name]["Vk"] = vk
-        stations[station_name]["Qk"] = 0
-    else:
-        stations[station_name]["Vk"] = '-'
-        stations[station_name]["Qk"] = qk
+    station.Vj, station.Qj = read_source(rs)
+    if station.Qj:
+        CDB.add_consumer(station.Qj, station, 'j')
+    station.Vk, station.Qk = read_source(rt)
+    if station.Qk:
+        CDB.add_consumer(station.Qk, station, 'k')
         
-    print(f"Issued Control instruction to station {station_name}: op={op}, rs={rs}, rt={rt}, name={name}")
-    return 0
+    station.busy = 1
+    station.op = op
+    station.A = target
+    station.time = getattr(context, row.latency)
+    station.state = "issued"
+    if tracer.issue >= tracer.INFO:
+        tracer.emit('issue', f"Issued Control instruction to station {station.name}: op={op}, "
+                             f"rs={register_name(rs)}, rt={register_name(rt)}, name={name}")
+    return station
@@ -0,0 +1,91 @@
+import struct
+
+import cache
+import context
+import execute
+import fetch
+import opcodes
+import tracer
+
+# Functional execution of the decoded program straight on the register file
+# and data memory: no stations, queues or CDB, and no clock. It needs a
+# drained pipeline (no station busy, no register waiting on a tag) and
+# leaves one behind, so it can hand over to the Tomasulo model at any point.
+
+# Optional record of the dynamic instruction stream (see replay.py): one
+# TRACE_PC per instruction, pc | TRACE_TAKEN for taken branches and jumps,
+# followed by a TRACE_ADDRESS for loads and stores.
+TRACE_PC = struct.Struct('<I')
+TRACE_ADDRESS = struct.Struct('<q')
+TRACE_TAKEN = 1 << 31
+
+def run_functional(max_instructions=None, stop_pc=None, warm_cache=True, trace=None):
+    # executes until the program ends, `max_instructions` have run or the
+    # pc reaches `stop_pc`; returns the number of instructions executed.
+    # With `trace` (a bytearray) every instruction is recorded into it.
+    program = context.decoded_program
+    # the table row of every instruction; unknown opcodes run as NOPs
+    rows = [opcodes.lookup(instruction.opcode) or opcodes.TABLE[0] for instruction in program]
+    registers = context.registers
+    end = len(program)
+    limit = -1 if max_instructions is None else max_instructions
+    get_from_memory = fetch.get_from_memory
+    write_to_memory = fetch.write_to_memory
+    fp_arithmatic = execute.execute_fp_arithmatic
+    integer_arithmatic = execute.execute_integer_arithmatic
+    access = cache.access
+    pack_pc = TRACE_PC.pack
+    pack_address = TRACE_ADDRESS.pack
+    LOAD, STORE, ADDER = opcodes.LOAD, opcodes.STORE, opcodes.ADDER
+    FP_ADDER, FP_MULT = opcodes.FP_ADDER, opcodes.FP_MULT
+    BRANCH, JUMP, JUMP_REGISTER = opcodes.BRANCH, opcodes.JUMP, opcodes.JUMP_REGISTER
+
+    pc = context.pc
+    count = 0
+    while pc < end and count != limit and pc != stop_pc:
+        instruction = program[pc]
+        row = rows[pc]
+        unit = row.unit
+        count += 1
+        current = pc
+        pc += 1
+        if unit == FP_ADDER or unit == FP_MULT:
+            registers[instruction.rd].Value = fp_arithmatic(row.opcode, registers[instruction.rs].Value,
+                                                            registers[instruction.rt].Value)
+        elif unit == LOAD or unit == STORE:
+            base = registers[instruction.rs].Value if instruction.rs is not None else 0
+            address = int(base) + int(instruction.immediate or 0)
+            if trace is not None:
+                trace += pack_pc(current)
+                trace += pack_address(address)
+            if unit == LOAD:
+                if warm_cache:
+                    access(address)
+                registers[instruction.rd].Value = get_from_memory(address, row.opcode)
+            else:
+                if warm_cache:
+                    access(address, is_write=True)
+                write_to_memory(address, registers[instruction.rd].Value, row.opcode)
+        elif row.shape == BRANCH:
+            if execute.compute_if_loop(registers[instruction.rs].Value, registers[instruction.rt].Value,
+                                       row.opcode):
+                pc = instruction.target
+        elif unit == ADDER:
+            rt = registers[instruction.rt].Value if instruction.rt is not None else 0
+            registers[instruction.rd].Value = integer_arithmatic(row.opcode, registers[instruction.rs].Value, rt,
+                                                                 instruction.immediate)
+        elif row.shape == JUMP:
+            if row.name == 'JAL':
+                registers[context.register_ids['R31']].Value = pc
+            pc = instruction.target
+        elif row.shape == JUMP_REGISTER:
+            pc = int(registers[instruction.rs].Value)
+        # NOP and the integer ADD/SUB/MUL/DIV, which have no unit and which
+        # the Tomasulo model issues without executing, change nothing
+        if trace is not None and unit != LOAD and unit != STORE:
+            trace += pack_pc(current if pc == current + 1 else current | TRACE_TAKEN)
+
+    context.pc = pc
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Functionally executed {count} instructions, PC: {pc}")
+    return count
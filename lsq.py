@@ -0,0 +1,200 @@
+import context
+import execute
+import fetch
+import rob
+import tracer
+
+# Memory disambiguation between the load buffers and older stores. A load
+# whose base is ready looks at every older store that has not reached
+# memory yet, youngest first: stores to other addresses are skipped, and the
+# first one that overlaps decides. If it writes exactly the bytes the load
+# reads and its data is ready, the data is forwarded and the load takes
+# store_forward_latency cycles instead of a cache access; otherwise the load
+# waits. A store's address is known as soon as its base register is.
+#
+# An older store whose address is still unknown makes the load wait, unless
+# context.load_bypass is set. Then the load goes ahead speculatively and is
+# checked again when it finishes executing: it is held until every older
+# address is known, and replayed (sent back to wait and start over) if the
+# answer changed. Nothing is broadcast before that check, so a replay only
+# costs the load itself.
+#
+# A load reads memory when its access starts. Without a reorder buffer a
+# store writes memory at writeback, so it in turn waits while an older load
+# that may read its bytes has not started, or started speculatively, and
+# while an older store that may write them has not written memory.
+
+WAIT = 'wait'
+MEMORY = 'memory'
+FORWARD = 'forward'
+
+# load station id -> (decision, store seq, value) from its last check; the
+# value is the forwarded data, or what the load read from memory
+decisions = {}
+# load station ids that started past a store with an unknown address
+speculative = set()
+# store seq -> cycles at which it forwarded data, until it reaches memory
+forwards = {}
+
+forwarded_loads = 0
+saved_cycles = 0
+load_replays = 0
+
+def initialize_lsq():
+    global decisions, speculative, forwards, forwarded_loads, saved_cycles, load_replays
+    decisions = {}
+    speculative = set()
+    forwards = {}
+    forwarded_loads = 0
+    saved_cycles = 0
+    load_replays = 0
+
+def address_of(base, offset):
+    return int(base) + int(offset)
+
+def forward_value(value, store_opcode, load_opcode):
+    # what the load would read back from memory after the store
+    store_layout = context.memory_formats[store_opcode]
+    value = float(value) if store_layout.format[-1] in 'fd' else int(value)
+    return context.memory_formats[load_opcode].unpack(store_layout.pack(value))[0]
+
+def station_address(station):
+    # A holds the effective address once the access has started
+    if station.state in ('executing', 'result'):
+        return station.A
+    if station.Qj != 0:
+        return None
+    return address_of(station.Vj, station.A)
+
+def older_stores(seq):
+    # (seq, address or None, opcode, data ready, data) of every store older
+    # than `seq` that has not written memory, youngest first
+    stores = []
+    for station in context.store_buffers:
+        if station.busy and station.state != 'clear' and station.seq < seq:
+            stores.append((station.seq, station_address(station), station.op, station.Qk == 0, station.Vk))
+    # with a reorder buffer, stores that have written back wait in it for commit
+    for entry in rob.live_entries() if rob.count else ():
+        if entry.ready and fetch.unit_for_opcode(entry.op) == context.STORE and entry.seq < seq:
+            stores.append((entry.seq, entry.address, entry.op, True, entry.value))
+    stores.sort(key=lambda store: store[0], reverse=True)
+    return stores
+
+def check_load(station):
+    # returns (decision, store seq, forwarded value, passed an unknown address)
+    address = station_address(station)
+    size = context.memory_formats[station.op].size
+    unknown = False
+    for seq, store_address, opcode, data_ready, data in older_stores(station.seq):
+        if store_address is None:
+            if not context.load_bypass:
+                return WAIT, seq, None, True
+            unknown = True
+            continue
+        store_size = context.memory_formats[opcode].size
+        if store_address + store_size <= address or address + size <= store_address:
+            continue
+        if store_address == address and store_size == size and data_ready:
+            return FORWARD, seq, forward_value(data, opcode, station.op), unknown
+        return WAIT, seq, None, unknown
+    return MEMORY, None, None, unknown
+
+def load_ready(station):
+    # called while the load waits to start; records how it will get its data
+    decision, seq, value, unknown = check_load(station)
+    if decision == WAIT:
+        if tracer.execute >= tracer.DEBUG:
+            tracer.emit('execute', f"Load {station.name} waits for an older store")
+        return False
+    decisions[station.id] = (decision, seq, value)
+    if unknown:
+        speculative.add(station.id)
+    else:
+        speculative.discard(station.id)
+    return True
+
+def store_ready(station):
+    # called while the store waits to start
+    if context.rob_entries:
+        return True
+    address = station_address(station)
+    size = context.memory_formats[station.op].size
+    for load in context.load_buffers:
+        if not load.busy or load.seq > station.seq or load.state == 'clear':
+            continue
+        if load.state in ('executing', 'result') and load.id not in speculative:
+            continue
+        load_address = station_address(load)
+        if load_address is not None:
+            load_size = context.memory_formats[load.op].size
+            if load_address + load_size <= address or address + size <= load_address:
+                continue
+        if tracer.execute >= tracer.DEBUG:
+            tracer.emit('execute', f"Store {station.name} waits for older load {load.name}")
+        return False
+    for store in context.store_buffers:
+        if not store.busy or store.seq >= station.seq or store.state == 'clear':
+            continue
+        store_address = station_address(store)
+        if store_address is not None:
+            store_size = context.memory_formats[store.op].size
+            if store_address + store_size <= address or address + size <= store_address:
+                continue
+        if tracer.execute >= tracer.DEBUG:
+            tracer.emit('execute', f"Store {station.name} waits for older store {store.name}")
+        return False
+    return True
+
+def start_load(station):
+    # returns the access time of a load, or None if it goes to the cache
+    global forwarded_loads
+    decision, seq, _ = decisions[station.id]
+    if decision != FORWARD:
+        return None
+    forwarded_loads += 1
+    forwards.setdefault(seq, []).append(context.clock_cycle)
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Store data forwarded to load {station.name}")
+    return context.store_forward_latency
+
+def read_load(station):
+    # called once the access has started and A holds the address
+    decision, seq, value = decisions[station.id]
+    if decision != MEMORY:
+        return
+    try:
+        value = execute.execute_instruction(station)
+    except (IndexError, ZeroDivisionError) as error:
+        # raised at writeback, where a reorder buffer defers it to commit
+        value = error
+    decisions[station.id] = (decision, seq, value)
+
+def validate_load(station):
+    # called when the load finishes executing: None lets it write back,
+    # 'hold' keeps it until older addresses are known, 'replay' restarts it
+    global load_replays
+    if station.id not in speculative:
+        return None
+    decision, seq, value, unknown = check_load(station)
+    if unknown:
+        return 'hold'
+    speculative.discard(station.id)
+    if (decision, seq) == decisions[station.id][:2]:
+        return None
+    load_replays += 1
+    if tracer.execute >= tracer.INFO:
+        tracer.emit('execute', f"Load {station.name} replayed: an older store wrote its address")
+    return 'replay'
+
+def load_result(station):
+    _, _, value = decisions.pop(station.id)
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+def store_written(seq):
+    # the cycles forwarding saved: each load would otherwise have waited
+    # until now for the store to reach memory
+    global saved_cycles
+    for cycle in forwards.pop(seq, ()):
+        saved_cycles += context.clock_cycle - cycle
@@ -0,0 +1,76 @@
+import math
+import operator
+import struct
+from collections import namedtuple
+
+# The instruction set as one table indexed by opcode. A row gives the
+# functional unit whose stations hold the instruction (None: it is decoded
+# but never gets a station), the context setting with its latency (None
+# for loads and stores, which take the cache's access time), the shape of its operands, the little-endian layout of its memory operand and
+# the operation execute applies to its operand values. context.isa, decode,
+# issue (fetch.py) and execute (execute.py) are all built from this table,
+# so a new instruction is a new row; only a new shape or unit needs code.
+
+# functional units; a station's unit indexes context.unit_prefixes
+UNITS = ADDER, MULT, FP_ADDER, FP_MULT, LOAD, STORE = range(6)
+
+# operand shapes
+NONE = 'none'                       # NOP
+MEMORY = 'memory'                   # rd, offset(rs)
+IMMEDIATE = 'immediate'             # rd, rs, #immediate
+REGISTER = 'register'               # rd, rs, rt
+JUMP = 'jump'                       # label
+JUMP_REGISTER = 'jump_register'     # rs
+BRANCH = 'branch'                   # rs, rt, label
+
+Opcode = namedtuple('Opcode', ('opcode', 'name', 'unit', 'latency', 'shape', 'layout', 'operation'))
+
+def fp_divide(rs, rt):
+    # IEEE 754 results instead of ZeroDivisionError
+    if rt == 0:
+        if rs == 0 or math.isnan(rs):
+            return math.nan
+        return math.copysign(math.inf, rs) * math.copysign(1.0, rt)
+    return rs / rt
+
+TABLE = (
+    Opcode(0, 'NOP', None, None, NONE, None, None),
+    Opcode(1, 'LW', LOAD, None, MEMORY, struct.Struct('<i'), None),
+    Opcode(2, 'LD', LOAD, None, MEMORY, struct.Struct('<q'), None),
+    Opcode(3, 'L.W', LOAD, None, MEMORY, struct.Struct('<f'), None),
+    Opcode(4, 'L.D', LOAD, None, MEMORY, struct.Struct('<d'), None),
+    Opcode(5, 'SW', STORE, None, MEMORY, struct.Struct('<i'), None),
+    Opcode(6, 'SD', STORE, None, MEMORY, struct.Struct('<q'), None),
+    Opcode(7, 'S.W', STORE, None, MEMORY, struct.Struct('<f'), None),
+    Opcode(8, 'S.D', STORE, None, MEMORY, struct.Struct('<d'), None),
+
+    # the register-register integer operations have no unit and are not issued
+    Opcode(9, 'ADD', None, None, REGISTER, None, operator.add),
+    Opcode(10, 'DADDI', ADDER, 'add_latency', IMMEDIATE, None, operator.add),
+    Opcode(11, 'SUB', None, None, REGISTER, None, operator.sub),
+    Opcode(12, 'DSUBI', ADDER, 'add_latency', IMMEDIATE, None, operator.sub),
+    Opcode(13, 'MUL', None, None, REGISTER, None, operator.mul),
+    Opcode(14, 'DIV', None, None, REGISTER, None, operator.truediv),
+
+    Opcode(15, 'ADD.D', FP_ADDER, 'fp_add_latency', REGISTER, None, operator.add),
+    Opcode(16, 'ADD.S', FP_ADDER, 'fp_add_latency', REGISTER, None, operator.add),
+    Opcode(17, 'SUB.D', FP_ADDER, 'fp_add_latency', REGISTER, None, operator.sub),
+    Opcode(18, 'SUB.S', FP_ADDER, 'fp_add_latency', REGISTER, None, operator.sub),
+    Opcode(19, 'MUL.D', FP_MULT, 'fp_mult_latency', REGISTER, None, operator.mul),
+    Opcode(20, 'MUL.S', FP_MULT, 'fp_mult_latency', REGISTER, None, operator.mul),
+    Opcode(21, 'DIV.D', FP_MULT, 'fp_div_latency', REGISTER, None, fp_divide),
+    Opcode(22, 'DIV.S', FP_MULT, 'fp_div_latency', REGISTER, None, fp_divide),
+
+    # jumps have no unit either; BEQ/BNE compare on an integer adder
+    Opcode(23, 'J', None, None, JUMP, None, None),
+    Opcode(24, 'JR', None, None, JUMP_REGISTER, None, None),
+    Opcode(25, 'JAL', None, None, JUMP, None, None),
+    Opcode(26, 'BEQ', ADDER, 'branch_latency', BRANCH, None, operator.eq),
+    Opcode(27, 'BNE', ADDER, 'branch_latency', BRANCH, None, operator.ne),
+)
+
+def lookup(opcode):
+    # the row of `opcode`, or None for the -1 decode gives unknown mnemonics
+    if 0 <= opcode < len(TABLE):
+        return TABLE[opcode]
+    return None
@@ -0,0 +1,123 @@
+import cProfile
+import io
+import pstats
+import time
+
+import context
+import cycles
+import CDB
+
+# Host-time instrumentation for the stages of the cycle loop. install()
+# swaps each stage function for a timing wrapper in its module, so callers
+# that go through the module attribute (cycles.fetch_cycle(), ...) are
+# measured; when the profiler is not installed nothing is wrapped and the
+# loop runs at full speed. Stages may nest: listen_to_CDB runs inside
+# writeback, the queue printouts inside fetch, and print_state inside
+# print_cycle whenever a full dump is due.
+STAGES = (
+    ('commit', cycles, 'commit_cycle'),
+    ('fetch', cycles, 'fetch_cycle'),
+    ('execute', cycles, 'execute_cycle'),
+    ('writeback', cycles, 'writeback_cycle'),
+    ('listen_to_CDB', CDB, 'listen_to_CDB'),
+    ('print_cycle', cycles, 'print_cycle_state'),
+    ('print_state', cycles, 'print_state'),
+    ('print_queues', cycles, 'print_queues'),
+    ('queue_changes', cycles, 'print_queue_changes'),
+)
+
+counts = {}
+nanoseconds = {}
+originals = {}
+
+# optional window of cycles [first, last] during which window_start() and
+# window_stop() bracket the simulation; by default they drive cProfile, but
+# any sampling profiler can be attached by replacing them
+window = None
+window_active = False
+window_start = None
+window_stop = None
+profile = None
+
+def timed(stage, function):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counts[stage] += 1
+            nanoseconds[stage] += time.perf_counter_ns() - start
+    return wrapper
+
+def watch_window(function):
+    def wrapper(*args, **kwargs):
+        global window_active
+        result = function(*args, **kwargs)
+        first, last = window
+        if not window_active and first <= context.clock_cycle <= last:
+            window_active = True
+            window_start()
+        elif window_active and context.clock_cycle > last:
+            window_active = False
+            window_stop()
+        return result
+    return wrapper
+
+def start_cprofile():
+    global profile
+    if profile is None:
+        profile = cProfile.Profile()
+    profile.enable()
+
+def stop_cprofile():
+    profile.disable()
+
+def install(cycle_window=None, start=None, stop=None):
+    global window, window_active, window_start, window_stop, profile
+    uninstall()
+    for stage, module, name in STAGES:
+        counts[stage] = 0
+        nanoseconds[stage] = 0
+        originals[stage] = getattr(module, name)
+        setattr(module, name, timed(stage, originals[stage]))
+
+    window = cycle_window
+    window_active = False
+    window_start = start or start_cprofile
+    window_stop = stop or stop_cprofile
+    profile = None
+    if window is not None:
+        originals['increment_cycle'] = cycles.increment_cycle
+        cycles.increment_cycle = watch_window(cycles.increment_cycle)
+
+def uninstall():
+    global window_active
+    if window_active:
+        window_active = False
+        window_stop()
+    for stage, module, name in STAGES:
+        if stage in originals:
+            setattr(module, name, originals.pop(stage))
+    if 'increment_cycle' in originals:
+        cycles.increment_cycle = originals.pop('increment_cycle')
+
+def summary(wall_time=None):
+    lines = [f"{'stage':<14} {'calls':>9} {'total ms':>10} {'ns/call':>9} {'share':>7}"]
+    for stage, _, _ in STAGES:
+        calls = counts.get(stage, 0)
+        total = nanoseconds.get(stage, 0)
+        per_call = total / calls if calls else 0.0
+        share = f"{total / (wall_time * 1e9):.1%}" if wall_time else ''
+        lines.append(f"{stage:<14} {calls:>9} {total / 1e6:>10.3f} {per_call:>9.0f} {share:>7}")
+    return '\n'.join(lines)
+
+def profile_report(path=None, limit=20):
+    # writes the window's cProfile data to `path`, or returns the top entries
+    if profile is None:
+        return ''
+    if path is not None:
+        profile.dump_stats(path)
+        return f"cProfile data for cycles {window[0]}-{window[1]} written to {path}"
+    stream = io.StringIO()
+    pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
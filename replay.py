@@ -0,0 +1,171 @@
+import argparse
+import json
+import struct
+import sys
+import time
+import zlib
+
+import context
+import cycles
+import execute
+import fetch
+import functional
+import lsq
+import opcodes
+import simulator
+import tracer
+
+# Trace-driven timing. record_trace() runs a program functionally and saves
+# its decoded program plus the dynamic instruction stream (pcs, branch
+# outcomes, load/store addresses). run_replay() unrolls that stream into the
+# instruction memory of a fresh machine and runs the Tomasulo model over it
+# with the functional work swapped out: nothing is decoded, no arithmetic
+# is done, addresses come from the trace and branches just release fetch.
+# Operand dependences still go through the register file and the CDB, so
+# the timing is the same as a detailed run of the program.
+
+MAGIC = b'TOMTRACE'
+HEADER_LENGTH = struct.Struct('<I')
+
+originals = {}
+
+def record_trace(path, max_instructions=None):
+    # records from the active machine's current state, which must be drained
+    trace = bytearray()
+    count = functional.run_functional(max_instructions, warm_cache=False, trace=trace)
+    header = json.dumps({
+        "count": count,
+        "program": [list(instruction) for instruction in context.decoded_program],
+    }).encode('utf-8')
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        file.write(zlib.compress(bytes(trace)))
+    return count
+
+def load_trace(path):
+    # returns the dynamic instruction stream as decoded instructions, with
+    # the effective address of every load and store in its immediate field
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not an instruction trace")
+    position = len(MAGIC)
+    (length,) = HEADER_LENGTH.unpack_from(data, position)
+    position += HEADER_LENGTH.size
+    header = json.loads(data[position:position + length].decode('utf-8'))
+    records = zlib.decompress(data[position + length:])
+
+    program = [fetch.Instruction(*fields) for fields in header["program"]]
+    stream = []
+    position = 0
+    unpack_pc = functional.TRACE_PC.unpack_from
+    unpack_address = functional.TRACE_ADDRESS.unpack_from
+    for _ in range(header["count"]):
+        (pc,) = unpack_pc(records, position)
+        position += functional.TRACE_PC.size
+        instruction = program[pc & ~functional.TRACE_TAKEN]
+        row = opcodes.lookup(instruction.opcode) or opcodes.TABLE[0]
+        if row.shape == opcodes.JUMP or row.shape == opcodes.JUMP_REGISTER:
+            # the stream already continues at the jump target, so the jump
+            # only takes its issue slot
+            instruction = instruction._replace(opcode=context.isa['NOP'], name='NOP')
+        elif row.unit == opcodes.LOAD or row.unit == opcodes.STORE:
+            (address,) = unpack_address(records, position)
+            position += functional.TRACE_ADDRESS.size
+            instruction = instruction._replace(immediate=address)
+        stream.append(instruction)
+    return stream
+
+def execute_instruction(station):
+    if station.unit == context.STORE:
+        return station.A
+    if station.op in fetch.branch_opcodes:
+        # the trace already holds the path taken; fetch goes on with the
+        # next recorded instruction
+        context.increment_pc(1)
+        context.unstall_pipeline()
+        return None
+    return 0
+
+def start_execution(station):
+    if station.unit == context.LOAD or station.unit == context.STORE:
+        station.Vj = 0
+    return originals['start_execution'](station)
+
+def write_to_memory(address, value, opcode):
+    pass
+
+def address_of(base, offset):
+    # the offset already is the recorded effective address
+    return int(offset)
+
+REPLAY_FUNCTIONS = (
+    (execute, 'execute_instruction', execute_instruction),
+    (cycles, 'start_execution', start_execution),
+    (fetch, 'write_to_memory', write_to_memory),
+    (lsq, 'address_of', address_of),
+)
+
+def install():
+    for module, name, function in REPLAY_FUNCTIONS:
+        if name not in originals:
+            originals[name] = getattr(module, name)
+            setattr(module, name, function)
+
+def uninstall():
+    for module, name, _ in REPLAY_FUNCTIONS:
+        if name in originals:
+            setattr(module, name, originals.pop(name))
+
+def run_replay(stream, config=None, stations=None, max_cycles=None):
+    # `stream` is a trace path or the list returned by load_trace()
+    if (config or {}).get('branch_predictor') is not None:
+        raise ValueError("A replay follows the recorded path and cannot model wrong-path issue")
+    if isinstance(stream, str):
+        stream = load_trace(stream)
+    install()
+    try:
+        machine = simulator.Simulator([], config=config, stations=stations)
+        context.decoded_program = stream
+        context.instruction_memory = [instruction.text for instruction in stream]
+        machine.run(max_cycles)
+        return machine.statistics()
+    finally:
+        uninstall()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Record an instruction trace or replay one through the timing model")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="run a program functionally and record its instruction stream")
+    record.add_argument("program")
+    record.add_argument("-o", "--output", required=True)
+    record.add_argument("--sample-state", action="store_true",
+                        help="load simulator.py's sample registers and memory first")
+    record.add_argument("--memory-image", default=None)
+    replay = commands.add_parser("replay", help="run a recorded trace through the timing model")
+    replay.add_argument("trace")
+    replay.add_argument("-n", "--cycles", type=int, default=None)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tracer.set_level(tracer.OFF)
+    start = time.perf_counter()
+    if args.command == "record":
+        simulator.Simulator(args.program, config={"data_memory_image": args.memory_image})
+        if args.sample_state:
+            simulator.load_initial_registers()
+            simulator.load_initial_memory()
+        count = record_trace(args.output)
+        print(f"Recorded {count} instructions in {time.perf_counter() - start:.3f} s", file=sys.stderr)
+    else:
+        statistics = run_replay(args.trace, max_cycles=args.cycles)
+        print(json.dumps(statistics, indent=2))
+        print(f"Replayed in {time.perf_counter() - start:.3f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
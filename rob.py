@@ -0,0 +1,132 @@
+import context
+import tracer
+
+# Reorder buffer. With context.rob_entries set, every instruction that gets
+# a station also gets a reorder buffer entry, and the register status (Qi)
+# and the CDB tag of its result name that entry instead of the station.
+# Writeback only fills the entry and wakes waiting stations, so the station
+# is free again right away; registers and memory change when the entry
+# reaches the head and cycles.commit_cycle() retires it, up to
+# context.commit_width entries per cycle. A fault raised while executing is
+# kept in the entry and re-raised at commit, so a wrong-path load outside
+# data memory is squashed like any other wrong-path instruction.
+#
+# Entry tags follow the station ids: the entry in slot i has tag
+# first_tag + i, so a tag is a station or an entry and never both.
+
+class ReorderBufferEntry:
+    __slots__ = ('id', 'name', 'busy', 'seq', 'op', 'dest', 'value', 'address', 'ready', 'fault')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.busy = 0
+        self.seq = 0
+        self.op = None
+        self.dest = None        # register id written at commit, None for stores and branches
+        self.value = None
+        self.address = None     # stores only
+        self.ready = False
+        self.fault = None
+
+    def __repr__(self):
+        return (f"{{'busy': {self.busy}, 'op': {self.op}, 'dest': {self.dest}, 'value': {self.value!r}, "
+                f"'address': {self.address!r}, 'ready': {self.ready}}}")
+
+buffer = []
+first_tag = 0
+head = 0
+count = 0
+
+committed_instructions = 0
+full_stall_cycles = 0
+
+def initialize_reorder_buffer():
+    global buffer, first_tag, head, count, committed_instructions, full_stall_cycles
+    first_tag = len(context.stations)
+    buffer = [ReorderBufferEntry(first_tag + i, f"ROB{i+1}") for i in range(context.rob_entries)]
+    head = 0
+    count = 0
+    committed_instructions = 0
+    full_stall_cycles = 0
+
+def is_tag(tag):
+    return len(buffer) != 0 and tag >= first_tag
+
+def entry(tag):
+    return buffer[tag - first_tag]
+
+def full():
+    return count == len(buffer)
+
+def live_entries():
+    # oldest first
+    return [buffer[(head + i) % len(buffer)] for i in range(count)]
+
+def head_entry():
+    if count == 0:
+        return None
+    return buffer[head]
+
+def allocate():
+    # returns the tag of a fresh entry at the tail; callers check full() first
+    global count
+    slot = buffer[(head + count) % len(buffer)]
+    count += 1
+    slot.busy = 1
+    slot.op = None
+    slot.dest = None
+    slot.value = None
+    slot.address = None
+    slot.ready = False
+    slot.fault = None
+    return slot.id
+
+def fill(station, dest):
+    # called once `station` has issued and has its sequence number
+    slot = entry(station.dest)
+    slot.seq = station.seq
+    slot.op = station.op
+    slot.dest = dest
+    if tracer.issue >= tracer.DEBUG:
+        tracer.emit('issue', f"Allocated reorder buffer entry {slot.name} for {station.name}")
+
+def complete(station, value, address=None, fault=None):
+    slot = entry(station.dest)
+    slot.value = value
+    slot.address = address
+    slot.fault = fault
+    slot.ready = True
+
+def retire():
+    global head, count, committed_instructions
+    buffer[head].busy = 0
+    head = (head + 1) % len(buffer)
+    count -= 1
+    committed_instructions += 1
+
+def ready_entry(tag):
+    # the entry whose value a register renamed to `tag` can supply at issue, or None
+    if not is_tag(tag):
+        return None
+    slot = entry(tag)
+    if slot.ready and slot.fault is None and slot.dest is not None:
+        return slot
+    return None
+
+def flush(seq):
+    # drops every entry younger than `seq` and points each register back at
+    # its newest remaining producer, or at the committed value
+    global count
+    while count and buffer[(head + count - 1) % len(buffer)].seq > seq:
+        count -= 1
+        buffer[(head + count) % len(buffer)].busy = 0
+    for register in context.registers:
+        if is_tag(register.Qi):
+            register.Qi = 0
+    for slot in live_entries():
+        if slot.dest is not None:
+            context.registers[slot.dest].Qi = slot.id
+
+def describe():
+    return str([f"{slot.name}:{'done' if slot.ready else 'busy'}" for slot in live_entries()])
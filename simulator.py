@@ -1,53 +1,500 @@
+import argparse
+import pickle
+import struct
+import time
+import zlib
+
+import branch
+import cache
 import context
 import fetch
 import execute
 import cycles
 import CDB
+import functional
+import lsq
+import profiler
+import rob
+import tracer
 
 
-fetch.set_in_register('R1', 0, 10)
-fetch.set_in_register('R2', 0, 5)
-fetch.set_in_register('R3', 0, 12)
-fetch.set_in_register('R10', 0, 77)
-fetch.set_in_register('R26', 0, 30)
-fetch.set_in_register('R27', 0, 20)
+# Module globals that make up one machine. A Simulator keeps its own copy of
+# these and binds them into the modules while it runs, so any number of
+# simulators can live in one process.
+MACHINE_STATE = (
+    (context, ('pc', 'clock_cycle', 'STALL', 'branch_stall_cycles', 'structural_stall_cycles',
+               'issued_instructions', 'instruction_memory', 'decoded_program', 'data_memory', 'data_view',
+               'registers', 'register_ids', 'general_registers', 'floating_point_registers',
+               'stations', 'station_ids', 'unit_stations', 'free_masks',
+               'adder_reservation_stations', 'fp_adder_reservation_stations',
+               'mult_reservation_stations', 'fp_mult_reservation_stations',
+               'load_buffers', 'store_buffers')),
+    (cycles, ('TBE_Queue', 'Execute_Queue', 'Ready_Queue', 'Waiting_Queue', 'Result_Queue', 'Clear_Queue')),
+    (CDB, ('CDB', 'CDB_Queue', 'consumers')),
+    (fetch, ('labels',)),
+    (branch, ('predictor', 'btb', 'pending', 'predictions', 'mispredictions', 'squashed_instructions',
+              'recovered_cycles', 'squashed_ranges')),
+    (rob, ('buffer', 'first_tag', 'head', 'count', 'committed_instructions', 'full_stall_cycles')),
+    (lsq, ('decisions', 'speculative', 'forwards', 'forwarded_loads', 'saved_cycles', 'load_replays')),
+    (cache, ('num_sets', 'associativity', 'tags', 'valid', 'dirty', 'stamps', 'access_counter', 'rng',
+             'hits', 'misses', 'evictions', 'writebacks', 'mshrs', 'write_buffer', 'drain_done',
+             'merged_misses', 'mshr_stall_cycles', 'mshr_occupancy', 'mshr_peak', 'coalesced_stores',
+             'write_buffer_stall_cycles', 'write_buffer_occupancy', 'write_buffer_peak',
+             'last_mshr_stall', 'last_write_buffer_stall')),
+)
 
-fetch.set_in_register('F1', 0, 5.5)
-fetch.set_in_register('F2', 0, 2.0)
-fetch.set_in_register('F3', 1, "A3")
-fetch.set_in_register('F10', 0, 10.0)
-fetch.set_in_register('F11', 0, 17.0)
+# context settings a Simulator may override, with their values at import time
+CONFIG_NAMES = (
+    'cache_size', 'block_size', 'cache_hit_latency', 'cache_miss_penalty', 'cache_associativity',
+    'cache_replacement', 'cache_write_back', 'cache_write_allocate', 'cache_seed',
+    'fp_add_latency', 'fp_mult_latency', 'fp_div_latency', 'add_latency',
+    'branch_latency', 'data_memory_size', 'data_memory_image', 'data_memory_write_through', 'skip_idle_cycles',
+    'branch_predictor', 'predictor_entries', 'predictor_history_bits', 'btb_entries',
+    'rob_entries', 'commit_width', 'store_forward_latency', 'load_bypass',
+    'mshr_entries', 'write_buffer_entries',
+)
+DEFAULT_CONFIG = {name: getattr(context, name) for name in CONFIG_NAMES}
 
-context.initialize_simulator('instructions.txt')
+active_simulator = None
 
-def done():
-    no_more_insts = context.pc >= len(context.instruction_memory)
+CHECKPOINT_VERSION = 1
+
+class Simulator:
+    def __init__(self, program, config=None, stations=None, registers=(32, 32)):
+        global active_simulator
+        if active_simulator is not None:
+            active_simulator.deactivate()
+
+        self.config = dict(DEFAULT_CONFIG)
+        for name, value in (config or {}).items():
+            if name not in DEFAULT_CONFIG:
+                raise ValueError(f"Unknown configuration setting '{name}'")
+            self.config[name] = value
+        self.state = None
+
+        self.apply_config()
+        context.data_memory = bytearray()
+        context.data_view = memoryview(context.data_memory)
+        cycles.initialize_queues()
+        CDB.initialize_CDB()
+        fetch.labels = {}
+        context.initialize_registers(*registers)
+        context.initialize_simulator(program, stations)
+        active_simulator = self
+
+    def apply_config(self):
+        for name, value in self.config.items():
+            setattr(context, name, value)
+        context.cache_lines = context.cache_size // context.block_size
+
+    def activate(self):
+        global active_simulator
+        if active_simulator is self:
+            return
+        if active_simulator is not None:
+            active_simulator.deactivate()
+        self.apply_config()
+        for module, names in MACHINE_STATE:
+            for name in names:
+                setattr(module, name, self.state[module.__name__][name])
+        active_simulator = self
+
+    def deactivate(self):
+        global active_simulator
+        if active_simulator is not self:
+            return
+        self.state = capture_machine_state()
+        active_simulator = None
+
+    def step(self):
+        self.activate()
+        step()
+        return done()
+
+    def run(self, max_cycles=None):
+        self.activate()
+        if done():
+            return True
+        return run(max_cycles, interactive=False)
+
+    def done(self):
+        self.activate()
+        return done()
+
+    def set_register(self, register, value):
+        self.activate()
+        fetch.set_in_register(register, 0, value)
+
+    def get_register(self, register):
+        self.activate()
+        return context.registers[context.register_ids[register]].Value
+
+    def load_memory(self, data, address=0):
+        self.activate()
+        context.load_data_memory(data, address)
+
+    def dump_memory(self, address=0, length=None):
+        self.activate()
+        return bytes(context.dump_data_memory(address, length))
+
+    def save_checkpoint(self, path):
+        # one pickle of every MACHINE_STATE global, so stations shared between
+        # the station lists, the queues and the CDB consumer index stay shared
+        self.activate()
+        state = capture_machine_state()
+        state['context']['data_memory'] = bytes(context.data_memory)
+        del state['context']['data_view']
+        payload = {"version": CHECKPOINT_VERSION, "config": self.config, "state": state}
+        with open(path, 'wb') as file:
+            file.write(zlib.compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)))
+
+    def statistics(self):
+        self.activate()
+        cycle_count = context.clock_cycle
+        # wrong-path instructions issue under a predictor but never retire
+        retired = context.issued_instructions - branch.squashed_instructions
+        return {
+            "finished": done(),
+            "cycles": cycle_count,
+            "instructions": retired,
+            "ipc": retired / cycle_count if cycle_count else 0.0,
+            "issued_instructions": context.issued_instructions,
+            "branch_stall_cycles": context.branch_stall_cycles,
+            "structural_stall_cycles": context.structural_stall_cycles,
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+            "cache_evictions": cache.evictions,
+            "cache_writebacks": cache.writebacks,
+            "merged_misses": cache.merged_misses,
+            "mshr_stall_cycles": cache.mshr_stall_cycles,
+            "mshr_occupancy": cache.mshr_occupancy / cycle_count if cycle_count else 0.0,
+            "mshr_peak": cache.mshr_peak,
+            "coalesced_stores": cache.coalesced_stores,
+            "write_buffer_stall_cycles": cache.write_buffer_stall_cycles,
+            "write_buffer_occupancy": cache.write_buffer_occupancy / cycle_count if cycle_count else 0.0,
+            "write_buffer_peak": cache.write_buffer_peak,
+            "branch_predictions": branch.predictions,
+            "branch_mispredictions": branch.mispredictions,
+            "squashed_instructions": branch.squashed_instructions,
+            "recovered_cycles": branch.recovered_cycles,
+            "committed_instructions": rob.committed_instructions,
+            "rob_full_stall_cycles": rob.full_stall_cycles,
+            "forwarded_loads": lsq.forwarded_loads,
+            "forwarding_saved_cycles": lsq.saved_cycles,
+            "load_replays": lsq.load_replays,
+        }
+
+
+def capture_machine_state():
+    return {module.__name__: {name: getattr(module, name) for name in names}
+            for module, names in MACHINE_STATE}
+
+def load_checkpoint(path):
+    global active_simulator
+    with open(path, 'rb') as file:
+        payload = pickle.loads(zlib.decompress(file.read()))
+    if payload.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} checkpoint")
+    if active_simulator is not None:
+        active_simulator.deactivate()
 
-    all_adders_free = all(not st["busy"] for st in context.fp_adder_reservation_stations.values())
-    all_mults_free  = all(not st["busy"] for st in context.fp_mult_reservation_stations.values())
-    all_fp_adders_free = all(not st["busy"] for st in context.adder_reservation_stations.values())
-    all_fp_mults_free  = all(not st["busy"] for st in context.mult_reservation_stations.values())
-    all_loads_free  = all(not st["busy"] for st in context.load_buffers.values())
-    all_stores_free = all(not st["busy"] for st in context.store_buffers.values())
+    # the restored data memory is a private copy, even if the checkpointed
+    # machine had a memory image mapped
+    simulator = Simulator.__new__(Simulator)
+    simulator.config = dict(payload["config"], data_memory_image=None, data_memory_write_through=False)
+    simulator.state = payload["state"]
+    memory = bytearray(simulator.state['context']['data_memory'])
+    simulator.state['context']['data_memory'] = memory
+    simulator.state['context']['data_view'] = memoryview(memory)
+    simulator.activate()
+    return simulator
 
-    queues_empty = not cycles.TBE_Queue and not cycles.Execute_Queue and not cycles.Ready_Queue \
-                   and not cycles.Waiting_Queue and not cycles.Result_Queue \
-                   and not CDB.CDB_Queue
+def load_initial_registers():
+    fetch.set_in_register('R1', 0, 10)
+    fetch.set_in_register('R2', 0, 5)
+    fetch.set_in_register('R3', 0, 12)
+    fetch.set_in_register('R10', 0, 77)
+    fetch.set_in_register('R26', 0, 30)
+    fetch.set_in_register('R27', 0, 20)
 
-    return no_more_insts and all_adders_free and all_fp_adders_free and all_mults_free and all_fp_mults_free and all_loads_free and all_stores_free and queues_empty
+    fetch.set_in_register('F1', 0, 5.5)
+    fetch.set_in_register('F2', 0, 2.0)
+    fetch.set_in_register('F3', 1, "A3")
+    fetch.set_in_register('F10', 0, 10.0)
+    fetch.set_in_register('F11', 0, 17.0)
 
+def load_initial_memory():
+    context.load_data_memory(struct.pack('<d', 10.0), 5)
+    context.load_data_memory(struct.pack('<d', 18.0), 13)
 
-while True:
-    input("Press Enter to proceed to the next cycle...")
+def pipeline_empty():
+    # every busy station sits in exactly one pipeline queue until it is
+    # cleared; buffered stores and outstanding fills must reach the cache too
+    return not cycles.TBE_Queue and not cycles.Execute_Queue and not cycles.Ready_Queue \
+           and not cycles.Waiting_Queue and not cycles.Result_Queue \
+           and not cycles.Clear_Queue and not CDB.CDB_Queue and not rob.count \
+           and not cache.write_buffer and not cache.mshrs
+
+def done():
+    no_more_insts = context.pc >= len(context.decoded_program)
+    return no_more_insts and pipeline_empty()
+
+def step():
     cycles.increment_cycle()
 
+    cycles.commit_cycle()
+
     cycles.writeback_cycle()
 
+    if context.mshr_entries or context.write_buffer_entries:
+        cache.memory_cycle()
+
     cycles.execute_cycle()
 
     cycles.fetch_cycle()
 
-    cycles.print_state()
+def run(max_cycles=None, interactive=True):
+    while True:
+        if interactive:
+            input("Press Enter to proceed to the next cycle...")
+        step()
+
+        if tracer.state >= tracer.DEBUG:
+            cycles.print_cycle_state()
+
+        if done():
+            return True
+        if max_cycles is not None and context.clock_cycle >= max_cycles:
+            return False
+
+        if context.skip_idle_cycles and not interactive and not cycles.idle_cycles_traced():
+            idle = cycles.idle_cycles()
+            if max_cycles is not None:
+                idle = min(idle, max_cycles - context.clock_cycle)
+            if idle > 0:
+                cycles.skip_cycles(idle)
+                if max_cycles is not None and context.clock_cycle >= max_cycles:
+                    return False
+
+def drain():
+    # stop issuing and run until every in-flight instruction has retired, so
+    # the state can be handed to functional.run_functional
+    get_current_instruction = fetch.get_current_instruction
+    fetch.get_current_instruction = lambda: None
+    try:
+        while not pipeline_empty():
+            step()
+    finally:
+        fetch.get_current_instruction = get_current_instruction
+
+def fast_forward(instructions=None, pc=None, warm_cache=True):
+    # runs functionally up to an instruction count or pc; the detailed model
+    # then starts from there with cleared cache statistics
+    drain()
+    count = functional.run_functional(instructions, pc, warm_cache)
+    cache.hits = cache.misses = cache.evictions = cache.writebacks = 0
+    return count
+
+def run_sampled(period, window, warmup=None, max_instructions=None):
+    # SMARTS-style sampling: every `period` instructions, `warmup` then
+    # `window` instructions run on the Tomasulo model and the rest
+    # functionally. Only the cycles between issuing the first and the last
+    # window instruction are measured, so pipeline fill and drain do not
+    # count, and the measured CPI is extrapolated to the whole run.
+    if warmup is None:
+        warmup = window
+    instructions = 0
+    window_instructions = 0
+    window_cycles = 0
+    windows = 0
+    while not done() and (max_instructions is None or instructions < max_instructions):
+        instructions += functional.run_functional(max(period - warmup - window, 0))
+        if done():
+            break
+        start_issued = context.issued_instructions
+        while context.issued_instructions - start_issued < warmup and not done():
+            step()
+        start_cycle = context.clock_cycle
+        measured_from = context.issued_instructions
+        while context.issued_instructions - measured_from < window and not done():
+            step()
+        window_instructions += context.issued_instructions - measured_from
+        window_cycles += context.clock_cycle - start_cycle
+        windows += 1
+        drain()
+        instructions += context.issued_instructions - start_issued
+    cpi = window_cycles / window_instructions if window_instructions else 0.0
+    return {
+        "finished": done(),
+        "instructions": instructions,
+        "windows": windows,
+        "window_instructions": window_instructions,
+        "window_cycles": window_cycles,
+        "cpi": cpi,
+        "estimated_cycles": round(cpi * instructions),
+    }
+
+def print_summary(finished, wall_time):
+    rate = context.clock_cycle / wall_time if wall_time > 0 else float('inf')
+    print('----------------------------------------')
+    print(f"Program finished: {'yes' if finished else 'no'}")
+    print(f"Simulated cycles: {context.clock_cycle}")
+    print(f"Host wall time: {wall_time:.6f} s")
+    print(f"Simulated cycles per second: {rate:.1f}")
+    print(f"Branch stall cycles: {context.branch_stall_cycles}, structural stall cycles: {context.structural_stall_cycles}")
+    print(cache.summary())
+    if context.mshr_entries or context.write_buffer_entries:
+        print(cache.parallelism_summary(context.clock_cycle))
+    if branch.predictor is not None:
+        accuracy = 1 - branch.mispredictions / branch.predictions if branch.predictions else 0.0
+        print(f"Branch predictions: {branch.predictions}, mispredictions: {branch.mispredictions}, "
+              f"accuracy: {accuracy:.2%}, squashed instructions: {branch.squashed_instructions}, "
+              f"cycles recovered: {branch.recovered_cycles}")
+    if lsq.forwarded_loads or lsq.load_replays:
+        print(f"Forwarded loads: {lsq.forwarded_loads}, stall cycles avoided: {lsq.saved_cycles}, "
+              f"load replays: {lsq.load_replays}")
+    if context.rob_entries:
+        print(f"Reorder buffer: {context.rob_entries} entries, commit width {context.commit_width}, "
+              f"committed: {rob.committed_instructions}, ROB-full stall cycles: {rob.full_stall_cycles}")
+    print('----------------------------------------')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tomasulo simulator")
+    parser.add_argument("program", nargs="?", default="instructions.txt",
+                        help="instruction file to simulate")
+    parser.add_argument("-b", "--batch", action="store_true",
+                        help="run without waiting for Enter between cycles")
+    parser.add_argument("-n", "--cycles", type=int, default=None,
+                        help="stop after this many cycles (implies --batch)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="suppress per-cycle output and only print the final state and a summary")
+    parser.add_argument("--memory-image", default=None,
+                        help="binary file to map as data memory instead of the built-in sample data")
+    parser.add_argument("--write-through", action="store_true",
+                        help="write stores back to the memory image file (default: copy-on-write)")
+    parser.add_argument("--save-checkpoint", default=None,
+                        help="save the machine state to this file when the run stops (see -n)")
+    parser.add_argument("--restore", default=None,
+                        help="resume from a checkpoint file instead of loading the program")
+    parser.add_argument("--no-skip", action="store_true",
+                        help="step every cycle instead of jumping over cycles where only execution counts down")
+    parser.add_argument("--profile", action="store_true",
+                        help="time the fetch, execute, writeback, CDB and state output stages and print a table")
+    parser.add_argument("--profile-cycles", default=None,
+                        help="FIRST:LAST cycles to run under cProfile (implies --profile)")
+    parser.add_argument("--profile-output", default=None,
+                        help="write the cProfile data to this file instead of printing the top entries")
+    parser.add_argument("--full-state", action="store_true",
+                        help="print the complete state every cycle instead of only what changed")
+    parser.add_argument("--snapshot-every", type=int, default=0,
+                        help="with change output, print the complete state every N cycles")
+    parser.add_argument("--predictor", choices=("taken", "not-taken", "bimodal", "gshare"), default=None,
+                        help="predict BEQ/BNE and issue speculatively instead of stalling on every branch")
+    parser.add_argument("--btb-entries", type=int, default=context.btb_entries,
+                        help="branch target buffer entries used by --predictor")
+    parser.add_argument("--rob-entries", type=int, default=context.rob_entries,
+                        help="commit results in order through a reorder buffer of this many entries (0: off)")
+    parser.add_argument("--commit-width", type=int, default=context.commit_width,
+                        help="reorder buffer entries committed per cycle")
+    parser.add_argument("--load-bypass", action="store_true",
+                        help="let loads start before older store addresses are known, replaying them on a match")
+    parser.add_argument("--mshrs", type=int, default=context.mshr_entries,
+                        help="miss status holding registers, so misses to different blocks overlap (0: unlimited)")
+    parser.add_argument("--write-buffer", type=int, default=context.write_buffer_entries,
+                        help="coalescing write buffer entries that stores retire into (0: stores access the cache)")
+    parser.add_argument("--fast-forward", type=int, default=None,
+                        help="execute this many instructions functionally before the detailed run")
+    parser.add_argument("--fast-forward-pc", type=int, default=None,
+                        help="execute functionally until the pc reaches this value")
+    parser.add_argument("--sample", default=None,
+                        help="PERIOD:WINDOW[:WARMUP], estimate timing by measuring WINDOW of every PERIOD "
+                             "instructions on the detailed model, after WARMUP (default WINDOW) detailed "
+                             "instructions, and running the rest functionally")
+    parser.add_argument("--trace", choices=tuple(tracer.LEVELS), default=None,
+                        help="trace level (default: debug, or warn with --quiet)")
+    parser.add_argument("--trace-only", default=None,
+                        help="comma separated trace categories to enable: " + ", ".join(tracer.CATEGORIES))
+    parser.add_argument("--trace-file", default=None,
+                        help="write the trace to this file instead of stdout")
+    parser.add_argument("--trace-binary", action="store_true",
+                        help="write the trace as binary records (see tracer.read_events)")
+    return parser.parse_args(argv)
+
+def configure_tracing(args):
+    level = args.trace or ("warn" if args.quiet else "debug")
+    if args.trace_only:
+        tracer.set_level(tracer.OFF)
+        tracer.set_level(level, args.trace_only.split(','))
+    else:
+        tracer.set_level(level)
+    tracer.open_output(args.trace_file, args.trace_binary)
+
+def main(argv=None):
+    args = parse_args(argv)
+    interactive = not (args.batch or args.quiet or args.cycles is not None)
+
+    configure_tracing(args)
+    cycles.state_output = "full" if args.full_state else "diff"
+    cycles.full_state_interval = args.snapshot_every
+
+    if args.restore:
+        simulator = load_checkpoint(args.restore)
+        simulator.config["skip_idle_cycles"] = not args.no_skip
+        simulator.apply_config()
+    else:
+        simulator = Simulator(args.program, config={
+            "data_memory_image": args.memory_image,
+            "data_memory_write_through": args.write_through,
+            "skip_idle_cycles": not args.no_skip,
+            "branch_predictor": args.predictor,
+            "btb_entries": args.btb_entries,
+            "rob_entries": args.rob_entries,
+            "commit_width": args.commit_width,
+            "load_bypass": args.load_bypass,
+            "mshr_entries": args.mshrs,
+            "write_buffer_entries": args.write_buffer,
+        })
+        load_initial_registers()
+        if args.memory_image is None:
+            load_initial_memory()
+    profiling = args.profile or args.profile_cycles is not None
+    if profiling:
+        window = None
+        if args.profile_cycles is not None:
+            first, last = args.profile_cycles.split(':')
+            window = (int(first), int(last))
+        profiler.install(window)
+    start = time.perf_counter()
+    if args.sample is not None:
+        sampled = run_sampled(*(int(part) for part in args.sample.split(':')))
+        finished = sampled["finished"]
+    else:
+        if args.fast_forward is not None or args.fast_forward_pc is not None:
+            fast_forward(args.fast_forward, args.fast_forward_pc)
+        finished = run(args.cycles, interactive=interactive)
+    wall_time = time.perf_counter() - start
+    if profiling:
+        profiler.uninstall()
+
+    context.flush_data_memory()
+    if args.save_checkpoint:
+        simulator.save_checkpoint(args.save_checkpoint)
+    tracer.close()
+    if args.quiet:
+        cycles.print_state()
+    if not interactive:
+        print_summary(finished, wall_time)
+    if args.sample is not None:
+        print(f"Sampled {sampled['windows']} windows, {sampled['window_instructions']} instructions in "
+              f"{sampled['window_cycles']} cycles, CPI {sampled['cpi']:.3f}")
+        print(f"Instructions: {sampled['instructions']}, estimated cycles: {sampled['estimated_cycles']}")
+    if profiling:
+        print(profiler.summary(wall_time))
+        report = profiler.profile_report(args.profile_output)
+        if report:
+            print(report)
+    return 0
+
 
-    if done():
-        break
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,214 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import replay
+import simulator
+import tracer
+
+STATION_PARAMETERS = ('a', 'fa', 'm', 'fm', 'l', 's')
+
+RESULT_FIELDS = ('finished', 'cycles', 'instructions', 'ipc', 'issued_instructions',
+                 'branch_stall_cycles', 'structural_stall_cycles',
+                 'cache_hits', 'cache_misses', 'cache_evictions', 'cache_writebacks',
+                 'merged_misses', 'mshr_stall_cycles', 'mshr_occupancy', 'mshr_peak', 'coalesced_stores',
+                 'write_buffer_stall_cycles', 'write_buffer_occupancy', 'write_buffer_peak',
+                 'branch_predictions', 'branch_mispredictions', 'squashed_instructions', 'recovered_cycles',
+                 'committed_instructions', 'rob_full_stall_cycles', 'forwarded_loads', 'forwarding_saved_cycles',
+                 'load_replays', 'host_seconds', 'error')
+
+def parse_values(spec):
+    # "1,2,3" is a list of values, "10:80" an inclusive integer range
+    if ':' in spec:
+        low, high = (int(part) for part in spec.split(':'))
+        return list(range(low, high + 1))
+    return [parse_value(part) for part in spec.split(',')]
+
+def parse_value(text):
+    text = text.strip()
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    if text in ('True', 'False'):
+        return text == 'True'
+    return text
+
+def parse_parameters(specs):
+    parameters = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip()
+        if name not in STATION_PARAMETERS and name not in simulator.CONFIG_NAMES:
+            raise ValueError(f"Unknown sweep parameter '{name}'")
+        parameters[name] = parse_values(values)
+    return parameters
+
+def grid_points(parameters):
+    names = list(parameters)
+    for values in itertools.product(*(parameters[name] for name in names)):
+        yield dict(zip(names, values))
+
+def random_points(parameters, samples, seed):
+    rng = random.Random(seed)
+    for _ in range(samples):
+        yield {name: rng.choice(values) for name, values in parameters.items()}
+
+def latin_hypercube_points(parameters, samples, seed):
+    # every parameter's value list is cut into `samples` equal strata and each
+    # stratum is used exactly once
+    rng = random.Random(seed)
+    columns = {}
+    for name, values in parameters.items():
+        strata = list(range(samples))
+        rng.shuffle(strata)
+        columns[name] = [values[int((stratum + rng.random()) / samples * len(values))] for stratum in strata]
+    for i in range(samples):
+        yield {name: columns[name][i] for name in parameters}
+
+def build_jobs(programs, points, registers, sample_state, max_cycles):
+    jobs = []
+    for point in points:
+        for program in programs:
+            jobs.append((program, point, registers, sample_state, max_cycles))
+    return jobs
+
+def run_job(job):
+    program, point, registers, sample_state, max_cycles = job
+    tracer.set_level(tracer.OFF)
+    stations = {name: value for name, value in point.items() if name in STATION_PARAMETERS}
+    config = {name: value for name, value in point.items() if name not in STATION_PARAMETERS}
+
+    row = {"program": program}
+    row.update(point)
+    start = time.perf_counter()
+    # a configuration that cannot run (bad cache geometry, a sample register
+    # waiting on a station that does not exist, ...) is reported, not fatal
+    try:
+        if program.endswith('.trace'):
+            row.update(replay.run_replay(program, config=config, stations=stations, max_cycles=max_cycles))
+            row["error"] = ""
+            row["host_seconds"] = time.perf_counter() - start
+            return row
+        machine = simulator.Simulator(program, config=config, stations=stations)
+        if sample_state:
+            simulator.load_initial_registers()
+            simulator.load_initial_memory()
+        for register, value in registers.items():
+            machine.set_register(register, value)
+        machine.run(max_cycles)
+    except (ValueError, KeyError, IndexError, ZeroDivisionError) as error:
+        row["finished"] = False
+        row["error"] = f"{type(error).__name__}: {error}"
+    else:
+        row.update(machine.statistics())
+        row["error"] = ""
+    row["host_seconds"] = time.perf_counter() - start
+    return row
+
+def run_sweep(jobs, workers=None):
+    if workers == 1:
+        return [run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(run_job, jobs, chunksize=chunksize))
+
+def ineffective_parameters(rows, parameters):
+    # a parameter has no effect when every pair of runs that differ only in
+    # its value gives the same results (e.g. predictor_entries with no
+    # predictor); random and lhs samples may hold no such pair to judge by
+    fields = [field for field in RESULT_FIELDS if field != 'host_seconds']
+    names = []
+    for name in parameters:
+        others = [other for other in parameters if other != name]
+        groups = {}
+        for row in rows:
+            key = (row['program'], *(row[other] for other in others))
+            groups.setdefault(key, []).append(row)
+        compared = False
+        for group in groups.values():
+            if len({row[name] for row in group}) < 2:
+                continue
+            compared = True
+            if len({tuple(row.get(field) for field in fields) for row in group}) > 1:
+                break
+        else:
+            if compared:
+                names.append(name)
+    return names
+
+def write_results(rows, parameter_names, output=None, output_format='csv'):
+    file = open(output, 'w', newline='') if output else sys.stdout
+    try:
+        if output_format == 'json':
+            json.dump(rows, file, indent=2)
+            file.write('\n')
+        else:
+            writer = csv.DictWriter(file, fieldnames=['program', *parameter_names, *RESULT_FIELDS])
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if output:
+            file.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the simulator over a grid or sample of configurations")
+    parser.add_argument("programs", nargs="+",
+                        help="instruction files to simulate, or .trace files recorded by replay.py")
+    parser.add_argument("-p", "--param", action="append", default=[],
+                        help="NAME=v1,v2,... or NAME=low:high; NAME is a context setting or a station count "
+                             "(" + ", ".join(STATION_PARAMETERS) + ")")
+    parser.add_argument("--sample", choices=("grid", "random", "lhs"), default="grid",
+                        help="how to pick configurations from the parameter values")
+    parser.add_argument("-n", "--samples", type=int, default=16,
+                        help="number of configurations for random and lhs sampling")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", action="append", default=[],
+                        help="initial register value, e.g. --set R2=5")
+    parser.add_argument("--sample-state", action="store_true",
+                        help="load simulator.py's sample registers and memory before each run")
+    parser.add_argument("--max-cycles", type=int, default=1000000)
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes (default: all cores; 1 runs in this process)")
+    parser.add_argument("-o", "--output", default=None, help="result file (default: stdout)")
+    parser.add_argument("--format", choices=("csv", "json"), default=None,
+                        help="result format (default: from the output file extension, else csv)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    parameters = parse_parameters(args.param)
+    registers = {}
+    for assignment in args.set:
+        register, _, value = assignment.partition('=')
+        registers[register.strip()] = parse_value(value)
+
+    if args.sample == "grid":
+        points = list(grid_points(parameters))
+    elif args.sample == "random":
+        points = list(random_points(parameters, args.samples, args.seed))
+    else:
+        points = list(latin_hypercube_points(parameters, args.samples, args.seed))
+
+    jobs = build_jobs(args.programs, points, registers, args.sample_state, args.max_cycles)
+    start = time.perf_counter()
+    rows = run_sweep(jobs, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    output_format = args.format or ('json' if args.output and args.output.endswith('.json') else 'csv')
+    write_results(rows, list(parameters), args.output, output_format)
+    for name in ineffective_parameters(rows, parameters):
+        print(f"warning: sweeping '{name}' did not change any result", file=sys.stderr)
+    print(f"{len(rows)} runs in {elapsed:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+import struct
+import sys
+
+import context
+
+# Trace levels. Every call site guards its message with a level check, e.g.
+#
+#     if tracer.issue >= tracer.INFO:
+#         tracer.emit('issue', f"Issued ...")
+#
+# so a disabled category costs one attribute lookup and a comparison; the
+# message itself is never formatted.
+OFF = 0
+WARN = 1
+INFO = 2
+DEBUG = 3
+
+LEVELS = {"off": OFF, "warn": WARN, "info": INFO, "debug": DEBUG}
+
+CATEGORIES = ('setup', 'cycle', 'issue', 'execute', 'cdb', 'writeback', 'memory', 'state', 'commit')
+
+setup = DEBUG
+cycle = DEBUG
+issue = DEBUG
+execute = DEBUG
+cdb = DEBUG
+writeback = DEBUG
+memory = DEBUG
+state = DEBUG
+commit = DEBUG
+
+# binary records: cycle (u32), category index (u8), message length (u32), utf-8 message
+RECORD_HEADER = struct.Struct('<IBI')
+
+output = sys.stdout
+binary = False
+
+def set_level(level, categories=None):
+    if isinstance(level, str):
+        level = LEVELS[level.lower()]
+    for category in categories or CATEGORIES:
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown trace category '{category}'")
+        globals()[category] = level
+
+def open_output(path=None, binary_stream=False):
+    global output, binary
+    close()
+    binary = binary_stream
+    if path is None:
+        output = sys.stdout.buffer if binary else sys.stdout
+    else:
+        output = open(path, 'wb' if binary else 'w')
+
+def close():
+    global output, binary
+    if output not in (sys.stdout, sys.stdout.buffer):
+        output.close()
+    output = sys.stdout
+    binary = False
+
+def emit(category, message):
+    if binary:
+        data = message.encode('utf-8')
+        output.write(RECORD_HEADER.pack(context.clock_cycle, CATEGORIES.index(category), len(data)))
+        output.write(data)
+    else:
+        output.write(message)
+        output.write('\n')
+
+def read_events(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    events = []
+    position = 0
+    while position < len(data):
+        cycle_number, category, length = RECORD_HEADER.unpack_from(data, position)
+        position += RECORD_HEADER.size
+        events.append((cycle_number, CATEGORIES[category], data[position:position + length].decode('utf-8')))
+        position += length
+    return events